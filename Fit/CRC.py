@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+#
+# copyright Tom Goetz
+#
+
+
+class CRC():
+    # FIT files use CRC-16 with the reflected 0x8005 polynomial and a 0 initial value
+    polynomial = 0xA001
+
+    def __init__(self, crc=0):
+        self.crc = crc
+
+    @staticmethod
+    def table_entry(byte):
+        crc = byte
+        for bit in xrange(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ CRC.polynomial
+            else:
+                crc >>= 1
+        return crc
+
+    def update(self, data):
+        crc = self.crc
+        crc_table = CRC.crc_table
+        for byte in bytearray(data):
+            crc = (crc >> 8) ^ crc_table[(crc ^ byte) & 0xff]
+        self.crc = crc
+
+    def value(self):
+        return self.crc
+
+    def __str__(self):
+        return ("%s: %04x" % (self.__class__.__name__, self.crc))
+
+
+CRC.crc_table = map(CRC.table_entry, xrange(256))
@@ -4,8 +4,6 @@
 # copyright Tom Goetz
 #
 
-import struct
-
 
 class Data():
 
@@ -23,7 +21,7 @@ class Data():
 
     def type_to_size(self, type):
         type_size = { 'CHAR' : 1, 'INT8' : 1, 'UINT8' : 1, 'INT16' : 2, 'UINT16' : 2, 'INT32' : 4, 'UINT32' : 4,
-                      'INT64' : 8, 'UINT64' : 8, 'FLOAT32' : 4, 'FLOAT64' : 4}
+                      'INT64' : 8, 'UINT64' : 8, 'FLOAT32' : 4, 'FLOAT64' : 8}
         return type_size[type]
 
     def type_to_unpack_format(self, type):
@@ -43,7 +41,7 @@ class Data():
                 unpack_format += self.type_to_unpack_format(type)
             file_size += (count * self.type_to_size(type))
         self.file_size += file_size
-        return struct.unpack(unpack_format, self.file.read(file_size))
+        return self.file.unpack(unpack_format, file_size)
 
     def __decode(self, schema):
         data = self.read(schema)
@@ -8,46 +8,107 @@ import collections
 
 from Field import Field
 from FieldStats import FieldStats
-from DataField import DataField
 
 
-class DataMessage():
-    def __init__(self, definition_message, file, english_units=False):
+class DataMessage(object):
+    # kept per record, so no instance dict
+    __slots__ = ['definition_message', '_fields', '_timestamp', '_field_layout', '_converters', '_data', '_pending']
+
+    def __init__(self, definition_message, file, english_units=False, timestamps_only=False, lazy=False, data=None):
         self.definition_message = definition_message
 
         self._fields = {}
-        self.file_size = 0
         self._timestamp = None
 
+        if timestamps_only:
+            decoder = definition_message.timestamp_decoder
+            self._field_layout = definition_message.timestamp_field_layout
+        else:
+            decoder = definition_message.decoder
+            self._field_layout = definition_message.field_layout
+        self._converters = definition_message.conversion_plan(english_units, timestamps_only)
+        # data is the already unpacked record when it was read elsewhere, as by a parallel decode worker
+        if data is None:
+            data = file.unpack_struct(decoder)
+        self._data = data
+
+        # in lazy mode the raw values are kept and fields are converted when they are first accessed
+        field_indexes = range(len(self._field_layout))
+        if lazy and not timestamps_only:
+            self._pending = set(field_indexes)
+        else:
+            self._pending = None
+            self._convert_fields(field_indexes)
+            self._data = None
+
+    def _convert_fields(self, field_indexes):
         field_values = {}
-        for index in xrange(definition_message.field_count()):
-            data_field = DataField(file, definition_message, definition_message.field_definitions[index], english_units)
-            self.file_size += data_field.file_size
+        for field_index in field_indexes:
+            (field, invalid, index, count) = self._field_layout[field_index]
+            (converter, invalid_value) = self._converters[field_index]
+            if count > 1:
+                value = list(self._data[index:index + count])
+                is_invalid = (value.count(invalid) == count)
+            else:
+                value = self._data[index]
+                is_invalid = (value == invalid)
+            if is_invalid:
+                # nothing to convert, and no subfields to expand from it
+                if not invalid_value.field._subfield:
+                    field_values[invalid_value.field.name] = invalid_value
+                continue
+            field_value = converter(value, invalid)
 
             # expand subfields?
-            field_value = data_field.value()
             subfield_names = field_value.subfield_names()
             if subfield_names:
                 for subfield_name in subfield_names:
                     subfield_value = field_value[subfield_name]
                     subfield_formal_name = subfield_value.field.name
-                    if subfield_formal_name in field_values.keys():
-                        field_values[subfield_formal_name]._value['value'] += subfield_value._value['value']
+                    if subfield_formal_name in field_values:
+                        field_values[subfield_formal_name]._value += subfield_value._value
                     else:
                         field_values[subfield_formal_name] = subfield_value
             else:
-                field_values[data_field.name()] = data_field.value()
+                field_values[field_value.name()] = field_value
 
         for field_value in field_values.values():
             field = field_value.field
             if field_value.field.is_dependant_field:
-                control_value = field_values[field.dependant_field_control_field]['orig']
-                field_value.field = field.dependant_field(control_value)
-                field_value.reconvert()
-                self._fields[field_value.field.name] = field_value
+                control_value = self._control_field_value(field.dependant_field_control_field, field_values)['orig']
+                dependant_field = self.definition_message.dependant_field(field, control_value)
+                if field_value.invalid():
+                    field_value = dependant_field.invalid_value(field_value['invalid'])
+                else:
+                    field_value.field = dependant_field
+                    field_value.reconvert()
+                self._fields[dependant_field.name] = field_value
             else:
                 self._fields[field_value.name()] = field_value
 
+    def _control_field_value(self, name, field_values):
+        if name in field_values:
+            return field_values[name]
+        if self._pending and name not in self._fields:
+            self._convert_pending(name)
+        return self._fields[name]
+
+    def _convert_pending(self, name):
+        field_indexes = [field_index for field_index in self.definition_message.field_groups.get(name, ())
+                         if field_index in self._pending]
+        if field_indexes:
+            self._pending.difference_update(field_indexes)
+            self._convert_fields(field_indexes)
+            if not self._pending:
+                self._data = None
+
+    def _convert_all(self):
+        if self._pending:
+            field_indexes = sorted(self._pending)
+            self._pending.clear()
+            self._convert_fields(field_indexes)
+            self._data = None
+
     def type(self):
         return self.definition_message.message_number()
 
@@ -58,24 +119,31 @@ class DataMessage():
         return self._timestamp
 
     def __getitem__(self, name):
+        if self._pending and name not in self._fields:
+            self._convert_pending(name)
         if name in self._fields:
             return self._fields[name]
         return None
 
     def __iter__(self):
+        self._convert_all()
         return iter(self._fields)
 
     def keys(self):
+        self._convert_all()
         return self._fields.keys()
 
     def items(self):
+        self._convert_all()
         return self._fields.items()
 
     def values(self):
+        self._convert_all()
         return self._fields.values()
 
     def __str__(self):
+        self._convert_all()
         fields_str = ''
         for field_name in self._fields.keys():
             fields_str += str(self._fields[field_name]) + ","
-        return ("%s: %s (%d): %s" % (self.__class__.__name__,  self.name(), self.type(), fields_str))
\ No newline at end of file
+        return ("%s: %s (%d): %s" % (self.__class__.__name__,  self.name(), self.type(), fields_str))
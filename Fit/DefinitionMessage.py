@@ -4,11 +4,12 @@
 # copyright Tom Goetz
 #
 
-import collections, logging
+import collections, logging, struct
 
 from Data import Data
 from Field import *
 from FieldDefinition import FieldDefinition
+from Reader import BufferReader
 
 
 logger = logging.getLogger(__name__)
@@ -105,7 +106,7 @@ class DefinitionMessage(Data):
                 }
             ],
         72  : [ 'training_file', {} ], # timestamp, serial_number, creation_time, product_ID, session_style
-        78  : [ 'hrv', {} ],
+        78  : [ 'hrv', { 0 : BeatIntervalField('time') } ],
         80  : [ 'ant_rx', {} ],
         81  : [ 'ant_tx', {} ],
         82  : [ 'ant_channel_id', {} ],
@@ -125,7 +126,9 @@ class DefinitionMessage(Data):
         128 : [ 'weather_conditions', {} ],
         129 : [ 'weather_alert', {} ],
         131 : [ 'cadence_zone', {} ],
-        132 : [ 'hr', {} ],
+        132 : [ 'hr', { 0 : FractionalTimestampField('fractional_timestamp'), 1 : Time256Field('time256'),
+                        6 : HeartRateField('filtered_bpm'), 9 : EventTimestampField('event_timestamp'),
+                        10 : EventTimestamp12Field('event_timestamp_12') } ],
         142 : [ 'segment_lap', {} ],
         145 : [ 'memo_glob', {} ],
         147 : [ 'sensor', {} ],
@@ -136,9 +139,21 @@ class DefinitionMessage(Data):
         160 : [ 'gps_metadata', {} ],
         161 : [ 'camera_event', {} ],
         162 : [ 'timestamp_correlation', {} ],
-        164 : [ 'gyroscope_data', {} ],
-        165 : [ 'accelerometer_data', {} ],
-        167 : [ 'three_d_sensor_calibration', {} ],
+        164 : [ 'gyroscope_data', { 0 : Field('timestamp_ms'), 1 : SampleTimeOffsetField(),
+                                    2 : SensorCountsField('gyro_x'), 3 : SensorCountsField('gyro_y'),
+                                    4 : SensorCountsField('gyro_z'), 5 : GyroField('calibrated_gyro_x'),
+                                    6 : GyroField('calibrated_gyro_y'), 7 : GyroField('calibrated_gyro_z') } ],
+        165 : [ 'accelerometer_data', { 0 : Field('timestamp_ms'), 1 : SampleTimeOffsetField(),
+                                        2 : SensorCountsField('accel_x'), 3 : SensorCountsField('accel_y'),
+                                        4 : SensorCountsField('accel_z'), 5 : AccelField('calibrated_accel_x'),
+                                        6 : AccelField('calibrated_accel_y'), 7 : AccelField('calibrated_accel_z'),
+                                        8 : CompressedAccelField('compressed_calibrated_accel_x'),
+                                        9 : CompressedAccelField('compressed_calibrated_accel_y'),
+                                        10 : CompressedAccelField('compressed_calibrated_accel_z') } ],
+        167 : [ 'three_d_sensor_calibration', { 0 : SensorTypeField('sensor_type'), 1 : Field('calibration_factor'),
+                                                2 : Field('calibration_divisor'), 3 : Field('level_shift'),
+                                                4 : Field('offset_cal'),
+                                                5 : OrientationMatrixField('orientation_matrix') } ],
         169 : [ 'video_frame', {} ],
         174 : [ 'obdii_data', {} ],
         177 : [ 'nmea_sentence', {} ],
@@ -152,7 +167,10 @@ class DefinitionMessage(Data):
         202 : [ 'exd_data_concept_configuration', {} ],
         206 : [ 'field_description', {} ],
         207 : [ 'dev_data_id', {} ],
-        208 : [ 'magnetometer_data', {} ],
+        208 : [ 'magnetometer_data', { 0 : Field('timestamp_ms'), 1 : SampleTimeOffsetField(),
+                                       2 : SensorCountsField('mag_x'), 3 : SensorCountsField('mag_y'),
+                                       4 : SensorCountsField('mag_z'), 5 : MagField('calibrated_mag_x'),
+                                       6 : MagField('calibrated_mag_y'), 7 : MagField('calibrated_mag_z') } ],
         0xFF00  : 'mfg_range_min',
         0xFFFE  : 'mfg_range_max',
     }
@@ -162,11 +180,14 @@ class DefinitionMessage(Data):
         253 : TimestampField(),
         254 : Field('message_index')
     }
+    timestamp_field_names = [ 'timestamp', 'timestamp_16', 'time_created' ]
     architecture_table = { 0 : 'Little Endian', 1 : 'Big Endian'}
+    # compiled definitions shared by all files, keyed by the raw definition and the field projection
+    definition_cache = {}
+    definition_cache_size = 1024
 
-    def __init__(self, record_header, file):
+    def __init__(self, file, message_fields=None, known_fields_only=False):
         Data.__init__(self, file, DefinitionMessage.primary_schema, DefinitionMessage.secondary_schema)
-        self.record_header = record_header
 
         if self.message_number() in DefinitionMessage.known_messages.keys():
             self.message_data = DefinitionMessage.known_messages[self.message_number()]
@@ -180,10 +201,171 @@ class DefinitionMessage(Data):
             self.file_size += field_definition.file_size
             self.field_definitions.append(field_definition)
 
+        if message_fields:
+            field_names = message_fields.get(self.name())
+        else:
+            field_names = None
+        self.compile_decoders(self.selected_field_numbers(field_names, known_fields_only))
+
+    @staticmethod
+    def projection_key(message_fields, known_fields_only):
+        if message_fields:
+            message_fields = tuple(sorted((name, tuple(sorted(field_names)))
+                                          for name, field_names in message_fields.iteritems()))
+        return (message_fields, known_fields_only)
+
+    @staticmethod
+    def load(file, message_fields=None, known_fields_only=False, projection_key=None):
+        # The same few definitions repeat in every file, so a definition is only compiled the first time its bytes
+        # are seen. Cached definitions are shared and must not be modified.
+        header = file.read(4)
+        field_count = file.read_byte()
+        field_definitions = file.read(field_count * 3)
+        if projection_key is None:
+            projection_key = DefinitionMessage.projection_key(message_fields, known_fields_only)
+        # buffer readers may return memoryview slices, copy them so the key holds the bytes themselves
+        header = bytes(bytearray(header))
+        field_definitions = bytes(bytearray(field_definitions))
+        key = (header[1:], field_definitions, projection_key)
+        definition_message = DefinitionMessage.definition_cache.get(key)
+        if definition_message is None:
+            data = header + chr(field_count) + field_definitions
+            definition_message = DefinitionMessage(BufferReader(data), message_fields, known_fields_only)
+            if len(DefinitionMessage.definition_cache) >= DefinitionMessage.definition_cache_size:
+                DefinitionMessage.definition_cache.clear()
+            DefinitionMessage.definition_cache[key] = definition_message
+        return definition_message
+
     def decode_optional(self):
         self.endian = self.architecture()
         return True
 
+    def compile_decoder(self, field_numbers=None):
+        # One struct for the whole data message: each entry in the field layout gives the field and the slice of
+        # the unpacked tuple that holds its value(s). Fields not in field_numbers are skipped as pad bytes.
+        if self.architecture():
+            unpack_format = '>'
+        else:
+            unpack_format = '<'
+        field_layout = []
+        index = 0
+        for field_definition in self.field_definitions:
+            field_number = field_definition.fdn_value()
+            if field_numbers is None or field_number in field_numbers:
+                count = field_definition.type_count()
+            else:
+                count = 0
+            if count:
+                unpack_format += '%d%s' % (count, field_definition.type_unpack_format())
+                field_layout.append((self.field(field_number), field_definition.invalid(), index, count))
+                index += count
+            padding = field_definition.size_value() - (count * field_definition.type_size())
+            if padding:
+                unpack_format += '%dx' % padding
+        return (struct.Struct(unpack_format), field_layout)
+
+    def field_numbers(self, field_names, known_fields_only=False):
+        field_numbers = []
+        for field_definition in self.field_definitions:
+            field_number = field_definition.fdn_value()
+            field = self.field(field_number)
+            if known_fields_only and not field.known_field:
+                continue
+            if field_names is None or set(field.names()) & set(field_names):
+                field_numbers.append(field_number)
+        return field_numbers
+
+    def selected_field_numbers(self, field_names, known_fields_only):
+        if field_names is None and not known_fields_only:
+            return None
+        selected_field_numbers = self.field_numbers(field_names, known_fields_only)
+        # always keep the fields needed to timestamp the message and to resolve the dependant fields that were asked for
+        required_names = set(DefinitionMessage.timestamp_field_names)
+        for field_number in selected_field_numbers:
+            field = self.field(field_number)
+            if field.is_dependant_field:
+                required_names.add(field.dependant_field_control_field)
+        return set(selected_field_numbers + self.field_numbers(required_names))
+
+    def compile_field_groups(self, field_layout):
+        # Map each name a data message field can appear under to the field layout entries that produce it. Entries
+        # that share a name (merged subfields) are in the same group so they are always converted together.
+        field_groups = {}
+        field_names = []
+        for field_index, (field, invalid, index, count) in enumerate(field_layout):
+            names = field.names()
+            field_names.append(names)
+            group = set([field_index])
+            for name in names:
+                group.update(field_groups.get(name, ()))
+            group = tuple(sorted(group))
+            for group_index in group:
+                for name in field_names[group_index]:
+                    field_groups[name] = group
+        return field_groups
+
+    def compile_dependant_fields(self, field_layout):
+        # Resolve every activity type for the dependant fields up front instead of building new fields per message.
+        # Messages hold the copy of a field for their units, so there is an entry for each units system's copy.
+        dependant_fields = {}
+        for (field, invalid, index, count) in field_layout:
+            if field.is_dependant_field:
+                for english_units in (False, True):
+                    units_field = field.for_units(english_units)
+                    dependant_fields[units_field] = {}
+                    for control_value in ActivityTypeField._type:
+                        try:
+                            dependant_fields[units_field][control_value] = units_field.dependant_field(control_value)
+                        except KeyError:
+                            pass
+        return dependant_fields
+
+    def dependant_field(self, field, control_value):
+        return self.dependant_fields[field][control_value]
+
+    def conversion_plan(self, english_units=False, timestamps_only=False):
+        key = (english_units, timestamps_only)
+        if key not in self.conversion_plans:
+            if timestamps_only:
+                field_layout = self.timestamp_field_layout
+            else:
+                field_layout = self.field_layout
+            self.conversion_plans[key] = [(field.converter(english_units),
+                                           field.for_units(english_units).invalid_value(invalid))
+                                          for (field, invalid, index, count) in field_layout]
+        return self.conversion_plans[key]
+
+    def compile_decoders(self, field_numbers=None):
+        self.selected_fields = field_numbers
+        (self.decoder, self.field_layout) = self.compile_decoder(field_numbers)
+        self.field_groups = self.compile_field_groups(self.field_layout)
+        self.dependant_fields = self.compile_dependant_fields(self.field_layout)
+        self.conversion_plans = {}
+        (self.timestamp_decoder, self.timestamp_field_layout) = \
+            self.compile_decoder(self.field_numbers(DefinitionMessage.timestamp_field_names))
+
+    def column_layout(self):
+        # (field number, field, invalid, byte offset, type, count) for each decoded field, for building array dtypes
+        column_layout = []
+        offset = 0
+        for field_definition in self.field_definitions:
+            field_number = field_definition.fdn_value()
+            count = field_definition.type_count()
+            if count and (self.selected_fields is None or field_number in self.selected_fields):
+                column_layout.append((field_number, self.field(field_number), field_definition.invalid(), offset,
+                                      field_definition.type_string(), count))
+            offset += field_definition.size_value()
+        return column_layout
+
+    def has_timestamps(self):
+        return len(self.timestamp_field_layout) > 0
+
+    def has_timestamp_16_only(self):
+        return [field.name for (field, invalid, index, count) in self.timestamp_field_layout] == ['timestamp_16']
+
+    def data_size(self):
+        return self.decoder.size
+
     def architecture(self):
         return self['architecture']
 
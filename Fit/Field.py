@@ -4,11 +4,16 @@
 # copyright Tom Goetz
 #
 
-import logging, time
+import logging, time, copy
 
 from time import time, gmtime, localtime, strftime
 from datetime import tzinfo, timedelta, datetime
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from FieldValue import FieldValue
 from FieldStats import FieldStats
 
@@ -34,8 +39,12 @@ class Field():
             self.type = (self.__class__.__name__)[:-len('Field')]
         if not name:
             self.name = self.type
+        # field names end up as keys in every data message, so share one copy of each
+        self.name = intern(self.name)
         self._subfield = {}
         self.units_type = self.attr_units_type_default
+        self._units_fields = { self.units_type : self }
+        self._invalid_values = {}
         self._stats_mode = stats_mode
 
     def name(self):
@@ -47,6 +56,16 @@ class Field():
     def sub_field(self, name):
         return _sub_field[name]
 
+    def names(self):
+        # the names this field's values are stored under in a data message
+        if self._subfield:
+            names = [subfield.name for subfield in self._subfield.values()]
+        else:
+            names = [self.name]
+        if self.is_dependant_field:
+            names += [self.dependant_field(control_value).name for control_value in ActivityTypeField._type]
+        return names
+
     def convert_single(self, value):
         return value / self._conversion_factor[self.units_type]
 
@@ -74,13 +93,89 @@ class Field():
     def convert_many_units(self, value):
         return self._convert_many(self.convert_single_units, value)
 
+    def for_units(self, english_units=False):
+        # Fields are shared by every file being parsed and must not change, so each units system gets its own copy
+        # of the field, made the first time it is needed.
+        if english_units:
+            units_type = Field.attr_units_type_english
+        else:
+            units_type = Field.attr_units_type_metric
+        try:
+            return self._units_fields[units_type]
+        except KeyError:
+            field = copy.copy(self)
+            field.units_type = units_type
+            field._invalid_values = {}
+            field._subfield = dict((name, subfield.for_units(english_units))
+                                   for name, subfield in self._subfield.iteritems())
+            self._units_fields[units_type] = field
+            return field
+
+    def units_field(self, field):
+        # the copy of field in this field's units system, for fields resolved from this one
+        return field.for_units(self.units_type == Field.attr_units_type_english)
+
     def convert(self, value, invalid, english_units=False):
+        field = self.for_units(english_units)
+        return FieldValue(field, invalid=invalid, value=field.convert_many(value),
+                            display=field.convert_many_display(value), orig=value)
+
+    def invalid_value(self, invalid):
+        # fields holding their base type's invalid value are not converted, they all share one value
+        try:
+            return self._invalid_values[invalid]
+        except KeyError:
+            field_value = FieldValue(self, invalid=invalid, display=None, orig=invalid)
+            self._invalid_values[invalid] = field_value
+            return field_value
+
+    def overrides(self, method_name):
+        return getattr(self.__class__, method_name).im_func is not getattr(Field, method_name).im_func
+
+    def converter(self, english_units=False):
+        # Compile convert() for one units type: plain scaled fields divide directly, the display value is reused
+        # when it is computed the same way as the value, and fields with their own convert() keep using it.
+        if self.overrides('convert') or self.overrides('convert_many') or self.overrides('_convert_many'):
+            return lambda value, invalid: self.convert(value, invalid, english_units)
+        field = self.for_units(english_units)
+        if field.overrides('convert_single'):
+            convert_single = field.convert_single
+        else:
+            conversion_factor = field._conversion_factor[field.units_type]
+            convert_single = lambda value: value / conversion_factor
+        if field.overrides('convert_single_display'):
+            convert_single_display = field.convert_single_display
+        else:
+            convert_single_display = None
+
+        def convert(value, invalid):
+            if isinstance(value, list):
+                converted_value = [convert_single(sub_value) for sub_value in value]
+                if convert_single_display:
+                    display_value = [convert_single_display(sub_value) for sub_value in value]
+                else:
+                    display_value = list(converted_value)
+            else:
+                converted_value = convert_single(value)
+                if convert_single_display:
+                    display_value = convert_single_display(value)
+                else:
+                    display_value = converted_value
+            return FieldValue(field, invalid=invalid, value=converted_value, display=display_value, orig=value)
+        return convert
+
+    def convert_column_values(self, column, english_units=False):
         if english_units:
-            self.units_type = Field.attr_units_type_english
+            conversion_factor = self._conversion_factor[Field.attr_units_type_english]
         else:
-            self.units_type = Field.attr_units_type_metric
-        return FieldValue(self, invalid=invalid, value=self.convert_many(value),
-                            display=self.convert_many_display(value), orig=value)
+            conversion_factor = self._conversion_factor[Field.attr_units_type_metric]
+        if conversion_factor == 1:
+            return column
+        return column / conversion_factor
+
+    def convert_column(self, column, invalid, english_units=False):
+        # whole array version of convert(): maps each resulting column name to its (values, invalid mask)
+        return { self.name : (self.convert_column_values(column, english_units), column == invalid) }
 
 
 class ManufacturerField(Field):
@@ -441,7 +536,7 @@ class ActiveCaloriesField(CaloriesField):
     def dependant_field(self, activity_type_index):
         dependant_field_name = self.name + "_" + ActivityTypeField._type[activity_type_index]
         dependant_field_stats_mode = ActivityTypeField._stats_mode[activity_type_index]
-        return CaloriesField(name=dependant_field_name, stats_mode=dependant_field_stats_mode)
+        return self.units_field(CaloriesField(name=dependant_field_name, stats_mode=dependant_field_stats_mode))
 
 
 class CaloriesDayField(Field):
@@ -471,20 +566,41 @@ class HeartRateField(Field):
 
 
 class TimestampField(Field):
+    # Timestamps stay integer seconds since the FIT epoch, shifted to local time, until they are written out.
+    # The local UTC offset only changes on 15 minute boundaries, so it is cached until the next one. The offset and
+    # its expiry are kept in one tuple so concurrent parses always see a matching pair.
+    utc_offset_cache = (0, 0)
+    utc_offset_period = 15 * 60
+
     def __init__(self, name='timestamp', utc=True):
         self.utc = utc
         Field.__init__(self, name)
 
-    def convert_single(self, value):
-        if self.utc:
-            timestamp = time()
+    @staticmethod
+    def utc_offset():
+        timestamp = time()
+        (utc_offset_secs, utc_offset_expires) = TimestampField.utc_offset_cache
+        if timestamp >= utc_offset_expires:
             time_now = datetime.fromtimestamp(timestamp)
             time_utc = datetime.utcfromtimestamp(timestamp)
-            utc_offset_secs = (time_now - time_utc).total_seconds()
+            utc_offset_secs = int(round((time_now - time_utc).total_seconds()))
+            utc_offset_expires = timestamp - (timestamp % TimestampField.utc_offset_period) + \
+                                 TimestampField.utc_offset_period
+            TimestampField.utc_offset_cache = (utc_offset_secs, utc_offset_expires)
+        return utc_offset_secs
+
+    def convert_single(self, value):
+        if self.utc:
             # hack - summary of the day messages appear at midnight and we want them to appear in the current day,
             # reimplement properly
-            value += (utc_offset_secs - 1)
-        return datetime(1989, 12, 31, 0, 0, 0) +  timedelta(0, value)
+            value += (TimestampField.utc_offset() - 1)
+        return value
+
+    def convert_column_values(self, column, english_units=False):
+        column = column.astype(numpy.int64)
+        if self.utc:
+            column += (TimestampField.utc_offset() - 1)
+        return column
 
 
 class TimeMsField(Field):
@@ -507,7 +623,7 @@ class CumActiveTimeField(TimeMsField):
     def dependant_field(self, activity_type_index):
         dependant_field_name = self.name + "_" + ActivityTypeField._type[activity_type_index]
         dependant_field_stats_mode = ActivityTypeField._stats_mode[activity_type_index]
-        return TimeMsField(name=dependant_field_name, stats_mode=dependant_field_stats_mode)
+        return self.units_field(TimeMsField(name=dependant_field_name, stats_mode=dependant_field_stats_mode))
 
 
 class TimeSField(Field):
@@ -538,7 +654,7 @@ class DurationField(TimeMinField):
     def dependant_field(self, activity_type_index):
         dependant_field_name = self.name + "_" + ActivityTypeField._type[activity_type_index]
         dependant_field_stats_mode = ActivityTypeField._stats_mode[activity_type_index]
-        return TimeMinField(name=dependant_field_name, stats_mode=dependant_field_stats_mode)
+        return self.units_field(TimeMinField(name=dependant_field_name, stats_mode=dependant_field_stats_mode))
 
 
 class IntensityMinsField(Field):
@@ -560,6 +676,11 @@ class ModerateActivityMinsField(Field):
                             intensity_mins=self._subfield['intensity_mins'].convert(value, invalid),
                             moderate_activity=self._subfield['moderate_activity'].convert(value, invalid))
 
+    def convert_column(self, column, invalid, english_units=False):
+        columns = self._subfield['intensity_mins'].convert_column(column, invalid, english_units)
+        columns.update(self._subfield['moderate_activity'].convert_column(column, invalid, english_units))
+        return columns
+
 
 class VigorousActivityMinsField(Field):
     _units = [ 'min', 'min' ]
@@ -574,6 +695,11 @@ class VigorousActivityMinsField(Field):
                             intensity_mins=self._subfield['intensity_mins'].convert(value * 2, invalid),
                             vigorous_activity=self._subfield['vigorous_activity'].convert(value, invalid))
 
+    def convert_column(self, column, invalid, english_units=False):
+        columns = self._subfield['intensity_mins'].convert_column(column * 2, invalid, english_units)
+        columns.update(self._subfield['vigorous_activity'].convert_column(column, invalid, english_units))
+        return columns
+
 
 class DistanceField(Field):
     _units = [ 'm', 'ft' ]
@@ -592,7 +718,7 @@ class MonitoringDistanceField(DistanceField):
     def dependant_field(self, activity_type_index):
         dependant_field_name = self.name + "_" + ActivityTypeField._type[activity_type_index]
         dependant_field_stats_mode = ActivityTypeField._stats_mode[activity_type_index]
-        return DistanceField(name=dependant_field_name, stats_mode=dependant_field_stats_mode)
+        return self.units_field(DistanceField(name=dependant_field_name, stats_mode=dependant_field_stats_mode))
 
 
 class SpeedField(Field):
@@ -650,8 +776,8 @@ class CyclesBaseField(Field):
     def dependant_field(self, activity_type_index):
         dependant_field_name = ActivityTypeField._type[activity_type_index]
         dependant_field_stats_mode = ActivityTypeField._stats_mode[activity_type_index]
-        return CyclesBaseField._dependant_field[activity_type_index](name=dependant_field_name,
-                                                                     stats_mode=dependant_field_stats_mode)
+        dependant_field = CyclesBaseField._dependant_field[activity_type_index]
+        return self.units_field(dependant_field(name=dependant_field_name, stats_mode=dependant_field_stats_mode))
 
 
 class ActivityField(Field):
@@ -738,6 +864,22 @@ class ActivityTypeIntensityField(Field):
                           activity_type=self._subfield['activity_type'].convert(activity_type, 0xff, english_units),
                           intensity=self._subfield['intensity'].convert(intensity, 0xff, english_units))
 
+    def converter(self, english_units=False):
+        activity_type_converter = self._subfield['activity_type'].converter(english_units)
+        intensity_converter = self._subfield['intensity'].converter(english_units)
+
+        def convert(value, invalid):
+            return FieldValue(self, ['activity_type', 'intensity'],
+                              invalid=invalid, value=self.convert_many(value), orig=value,
+                              activity_type=activity_type_converter(value & 0x1f, 0xff),
+                              intensity=intensity_converter(value >> 5, 0xff))
+        return convert
+
+    def convert_column(self, column, invalid, english_units=False):
+        columns = self._subfield['activity_type'].convert_column(column & 0x1f, 0xff, english_units)
+        columns.update(self._subfield['intensity'].convert_column(column >> 5, 0xff, english_units))
+        return columns
+
 
 class PercentField(Field):
     _units = [ '%', '%' ]
@@ -954,3 +1096,166 @@ class ClimbField(Field):
         return FieldValue(self, ['climb', 'floors'], invalid=invalid, value=self.convert_many(value), orig=value,
                             climb=self._subfield['climb'].convert(value, invalid, english_units),
                             floors=self._subfield['floors'].convert(value, invalid, english_units))
+
+    def converter(self, english_units=False):
+        climb_converter = self._subfield['climb'].converter(english_units)
+        floors_converter = self._subfield['floors'].converter(english_units)
+
+        def convert(value, invalid):
+            return FieldValue(self, ['climb', 'floors'], invalid=invalid, value=self.convert_many(value), orig=value,
+                              climb=climb_converter(value, invalid), floors=floors_converter(value, invalid))
+        return convert
+
+    def convert_column(self, column, invalid, english_units=False):
+        columns = self._subfield['climb'].convert_column(column, invalid, english_units)
+        columns.update(self._subfield['floors'].convert_column(column, invalid, english_units))
+        return columns
+
+
+class SensorTypeField(Field):
+    _type = { 0 : 'accelerometer', 1 : 'gyroscope', 2 : 'compass', 3 : 'barometer' }
+
+    def __init__(self, *args, **kwargs):
+        Field.__init__(self, *args, **kwargs)
+
+    def convert_single(self, value):
+        try:
+            return SensorTypeField._type[value]
+        except KeyError:
+            return value
+
+
+class OrientationMatrixField(Field):
+    _conversion_factor = [ 65535.0, 65535.0 ]
+    def __init__(self, *args, **kwargs):
+        Field.__init__(self, *args, **kwargs)
+
+
+class SampleArrayField(Field):
+    # Sensor messages pack up to hundreds of samples per field, the whole array is converted in one numpy operation.
+    def __init__(self, *args, **kwargs):
+        Field.__init__(self, *args, **kwargs)
+
+    def converter(self, english_units=False):
+        if numpy is None:
+            return Field.converter(self, english_units)
+        field = self.for_units(english_units)
+        conversion_factor = field._conversion_factor[field.units_type]
+
+        def convert(value, invalid):
+            values = numpy.array(value)
+            if conversion_factor != 1:
+                values = values / conversion_factor
+            return FieldValue(field, invalid=invalid, value=values, display=values, orig=value)
+        return convert
+
+
+class SampleTimeOffsetField(SampleArrayField):
+    _units = [ 'ms', 'ms' ]
+    def __init__(self, *args, **kwargs):
+        SampleArrayField.__init__(self, 'sample_time_offset', *args, **kwargs)
+
+
+class SensorCountsField(SampleArrayField):
+    _units = [ 'counts', 'counts' ]
+    def __init__(self, *args, **kwargs):
+        SampleArrayField.__init__(self, *args, **kwargs)
+
+
+class AccelField(SampleArrayField):
+    _units = [ 'g', 'g' ]
+    def __init__(self, *args, **kwargs):
+        SampleArrayField.__init__(self, *args, **kwargs)
+
+
+class CompressedAccelField(AccelField):
+    _conversion_factor = [ 1000.0, 1000.0 ]
+    def __init__(self, *args, **kwargs):
+        AccelField.__init__(self, *args, **kwargs)
+
+
+class GyroField(SampleArrayField):
+    _units = [ 'deg/s', 'deg/s' ]
+    def __init__(self, *args, **kwargs):
+        SampleArrayField.__init__(self, *args, **kwargs)
+
+
+class MagField(SampleArrayField):
+    _units = [ 'G', 'G' ]
+    def __init__(self, *args, **kwargs):
+        SampleArrayField.__init__(self, *args, **kwargs)
+
+
+class FractionalTimestampField(Field):
+    _units = [ 's', 's' ]
+    _conversion_factor = [ 32768.0, 32768.0 ]
+    def __init__(self, *args, **kwargs):
+        Field.__init__(self, *args, **kwargs)
+
+
+class Time256Field(Field):
+    _units = [ 's', 's' ]
+    _conversion_factor = [ 256.0, 256.0 ]
+    def __init__(self, *args, **kwargs):
+        Field.__init__(self, *args, **kwargs)
+
+
+class EventTimestampField(Field):
+    _units = [ 's', 's' ]
+    _conversion_factor = [ 1024.0, 1024.0 ]
+    def __init__(self, *args, **kwargs):
+        Field.__init__(self, *args, **kwargs)
+
+
+class EventTimestamp12Field(Field):
+    # A byte array holding pairs of 12 bit event timestamps, the low bits of event_timestamp, in every 3 bytes.
+    def __init__(self, *args, **kwargs):
+        Field.__init__(self, *args, **kwargs)
+
+    @staticmethod
+    def unpack(packed):
+        # packed is an array of rows of bytes, returns the rows of 12 bit values
+        packed = numpy.asarray(packed, dtype=numpy.uint16)
+        # an odd number of values ends in half a triplet
+        padding = -packed.shape[-1] % 3
+        if padding:
+            packed = numpy.concatenate((packed, numpy.zeros(packed.shape[:-1] + (padding, ), numpy.uint16)), -1)
+        triplets = packed.reshape(packed.shape[:-1] + (-1, 3))
+        first = triplets[..., 0] | ((triplets[..., 1] & 0x0f) << 8)
+        second = (triplets[..., 1] >> 4) | (triplets[..., 2] << 4)
+        return numpy.stack((first, second), -1).reshape(packed.shape[:-1] + (-1, ))
+
+    def converter(self, english_units=False):
+        if numpy is None:
+            return Field.converter(self, english_units)
+        field = self.for_units(english_units)
+
+        def convert(value, invalid):
+            values = EventTimestamp12Field.unpack(value)
+            return FieldValue(field, invalid=invalid, value=values, display=values, orig=value)
+        return convert
+
+    def convert_column(self, column, invalid, english_units=False):
+        # every byte value is valid in packed data
+        values = EventTimestamp12Field.unpack(column)
+        return { self.name : (values, numpy.zeros(values.shape, bool)) }
+
+
+class BeatIntervalField(SampleArrayField):
+    _units = [ 's', 's' ]
+    _conversion_factor = [ 1000.0, 1000.0 ]
+    def __init__(self, *args, **kwargs):
+        SampleArrayField.__init__(self, *args, **kwargs)
+
+    def converter(self, english_units=False):
+        if numpy is None:
+            return SampleArrayField.converter(self, english_units)
+        field = self.for_units(english_units)
+        conversion_factor = field._conversion_factor[field.units_type]
+
+        def convert(value, invalid):
+            # the unused intervals at the end of the array are dropped
+            values = numpy.array(value)
+            values = values[values != invalid] / conversion_factor
+            return FieldValue(field, invalid=invalid, value=values, display=values, orig=value)
+        return convert
@@ -66,9 +66,14 @@ class FieldDefinition(Data):
     def type_string(self):
         return (self.base_type())[3]
 
+    def type_size(self):
+        return self.type_to_size(self.type_string())
+
     def type_count(self):
-        type_size = self.type_to_size(self.type_string())
-        return (self.size_value() / type_size)
+        return (self.size_value() / self.type_size())
+
+    def type_unpack_format(self):
+        return self.type_to_unpack_format(self.type_string())
 
     def __str__(self):
         return ("%s: type %d: %d of %s" % (self.__class__.__name__, self.fdn_value(), self.size_value(), self.type_string()));
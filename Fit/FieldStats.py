@@ -82,7 +82,7 @@ class AggregateStats():
 
     def accumulate(self, name, field_value):
         stats_mode = field_value.field._stats_mode
-        if stats_mode:
+        if stats_mode and not field_value.invalid():
             self._accumulate(name, field_value.value(), stats_mode)
 
     def hourly_accumulate(self, name, field_value):
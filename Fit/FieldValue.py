@@ -5,18 +5,27 @@
 #
 
 
-class FieldValue():
-    def __init__(self, field, subfield_names=None, **kwargs):
+class FieldValue(object):
+    # There is one of these for every field of every message, so the values are kept in slots rather than a dict.
+    # The few fields with subfields keep the subfield values in a small dict.
+    __slots__ = ['field', '_subfield_names', '_invalid', '_value', '_display', '_orig', '_subfield_values']
+    value_slots = { 'invalid' : '_invalid', 'value' : '_value', 'display' : '_display', 'orig' : '_orig' }
+    value_names = ['invalid', 'value', 'display', 'orig']
+    missing = object()
+
+    def __init__(self, field, subfield_names=None, invalid=None, value=None, display=missing, orig=None,
+                 **subfield_values):
         self.field = field
         self._subfield_names = subfield_names
-
-        self._value = {}
-        if kwargs is not None:
-            for key, value in kwargs.iteritems():
-                self._value[key] = value
+        self._invalid = invalid
+        self._value = value
+        if display is not FieldValue.missing:
+            self._display = display
+        self._orig = orig
+        self._subfield_values = subfield_values or None
 
     def invalid(self):
-        return (self['value'] == self['invalid'])
+        return (self._orig == self._invalid)
 
     def name(self):
         return self.field.name
@@ -28,31 +37,44 @@ class FieldValue():
         return self.field.type
 
     def value(self):
-        return self['value']
+        return self._value
 
     def reconvert(self):
-        self._value['value'] = self.field.convert_many(self._value['orig'])
+        self._value = self.field.convert_many(self._orig)
 
     def units(self):
-        return self.field.units(self['orig'])
+        # invalid values hold their base type's invalid value, which has no units to look up
+        if self.invalid():
+            return None
+        return self.field.units(self._orig)
 
     def stats(self):
         return self.field.stats()
 
     def __getitem__(self, name):
-        return self._value[name]
+        try:
+            return getattr(self, FieldValue.value_slots[name])
+        except AttributeError:
+            raise KeyError(name)
+        except KeyError:
+            if self._subfield_values:
+                return self._subfield_values[name]
+            raise
 
     def __iter__(self):
-        return iter(self._value)
+        return iter(self.keys())
 
     def keys(self):
-        return self._value.keys()
+        keys = [name for name in FieldValue.value_names if hasattr(self, FieldValue.value_slots[name])]
+        if self._subfield_values:
+            keys += self._subfield_values.keys()
+        return keys
 
     def items(self):
-        return self._value.items()
+        return [(name, self[name]) for name in self.keys()]
 
     def values(self):
-        return self._value.values()
+        return [self[name] for name in self.keys()]
 
     def __str__(self):
         field_string = self.name() + " " + str(self['value'])
@@ -64,4 +86,4 @@ class FieldValue():
         return field_string
 
     def __repr__(self):
-        return self.__str__()
\ No newline at end of file
+        return self.__str__()
@@ -4,13 +4,20 @@
 # copyright Tom Goetz
 #
 
-import sys, logging, collections, traceback
-from datetime import tzinfo, timedelta, datetime
+import os, sys, logging, collections, traceback, mmap, multiprocessing, itertools
 
+from Reader import StreamReader, BufferReader
+from CRC import CRC
 from FileHeader import FileHeader
+from FileIndex import FileIndex
 from RecordHeader import RecordHeader
 from DefinitionMessage import DefinitionMessage
 from DataMessage import DataMessage
+from MessageColumns import MessageColumns
+from SensorData import SensorData
+from HeartRateData import HeartRateData
+from HrvData import HrvData
+from Track import Track
 from MonitoringOutputData import MonitoringOutputData
 from DeviceOutputData import DeviceOutputData
 
@@ -27,21 +34,176 @@ class FitParseError(Exception):
         return repr(self.message + ": " + self.tb)
 
 
+def check_file(filename, chunk_size=65536):
+    # Validate the header and the file CRC without decoding any records.
+    with open(filename, 'rb') as file:
+        reader = StreamReader(file, CRC())
+        try:
+            file_header = FileHeader(reader)
+        except IndexError as error:
+            raise FitParseError(str(error) + " in " + filename)
+        if not file_header.check():
+            raise FitParseError("Bad header in %s: %s" % (filename, str(file_header)))
+        if not file_header.check_crc():
+            raise FitParseError("Bad header CRC in " + filename)
+        remaining = file_header.get_header_size() + file_header.get_data_size() + 2 - file_header.file_size
+        if file_header.file_size + remaining > reader.size:
+            raise FitParseError("File truncated, %d of %d bytes in %s" %
+                                (reader.size, file_header.file_size + remaining, filename))
+        while remaining > 0:
+            reader.read(min(remaining, chunk_size))
+            remaining -= chunk_size
+        if reader.crc_value() != 0:
+            raise FitParseError("Bad file CRC in " + filename)
+    return file_header
+
+
+FileMetadata = collections.namedtuple('FileMetadata', ['filename', 'type', 'product', 'serial_number', 'time_created',
+                                                     'first_timestamp', 'data_size'])
+
+
+def field_value(data_message, field_name):
+    field_value = data_message[field_name]
+    if field_value is None or field_value.invalid():
+        return None
+    return field_value.value()
+
+
+def scan_metadata(filename):
+    # Decode just enough of a file to catalogue it: the header, file_id, the first device_info, and the first
+    # message timestamp. Reading stops as soon as they have been seen, so a partially downloaded file can still be
+    # catalogued when they are at its start.
+    file_id = None
+    device_info = None
+    # every message type is read, lazily, so the loop sees the first message after file_id and device_info
+    with File(filename, streaming=True, lazy=True, check_crc=False) as file:
+        for (message_name, message_timestamp, data_message) in file.iter_messages(check_size=False):
+            if message_name == 'file_id' and file_id is None:
+                file_id = data_message
+            elif message_name == 'device_info' and device_info is None:
+                device_info = data_message
+            if file_id and device_info and file.first_message_timestamp is not None:
+                break
+    if not file.file_header.check():
+        return None
+    product = None
+    serial_number = None
+    time_created = None
+    file_type = None
+    if file_id:
+        file_type = field_value(file_id, 'type')
+        product = field_value(file_id, 'product')
+        serial_number = field_value(file_id, 'serial_number')
+        time_created = field_value(file_id, 'time_created')
+    if device_info:
+        if product is None:
+            product = field_value(device_info, 'garmin_product')
+        if serial_number is None:
+            serial_number = field_value(device_info, 'serial_number')
+    return FileMetadata(filename, file_type, product, serial_number, time_created, file.first_message_timestamp,
+                        file.file_header.get_data_size())
+
+
+def decode_records(chunk):
+    # Worker for File.parse_parallel(): unpack a chunk of data records given their offsets and the offsets of the
+    # definitions in effect for them. Only the raw values are passed back, converted messages are several times more
+    # expensive to unpickle than to build, so the parent builds lazy messages from the values and fills in their
+    # timestamps once all chunks are back in order.
+    (filename, message_fields, known_fields_only, records) = chunk
+    projection_key = DefinitionMessage.projection_key(message_fields, known_fields_only)
+    with open(filename, 'rb') as file:
+        file_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    reader = BufferReader(file_map, source=file_map)
+    records_data = []
+    definition_offset = None
+    try:
+        for (record_offset, record_definition_offset, timestamps_only) in records:
+            if record_definition_offset != definition_offset:
+                reader.seek(record_definition_offset + 1)
+                definition_message = DefinitionMessage.load(reader, message_fields, known_fields_only, projection_key)
+                definition_offset = record_definition_offset
+            reader.seek(record_offset + 1)
+            if timestamps_only:
+                records_data.append(reader.unpack_struct(definition_message.timestamp_decoder))
+            else:
+                records_data.append(reader.unpack_struct(definition_message.decoder))
+    finally:
+        reader.close()
+    return records_data
+
+
 class File():
-    def __init__(self, filename, english_units=False):
+    read_mode_stream = 0
+    read_mode_mmap = 1
+    read_mode_buffer = 2
+
+    def __init__(self, filename, english_units=False, read_mode=read_mode_stream, buffer=None, data=None,
+                 streaming=False, message_types=None, message_fields=None, known_fields_only=False, lazy=False,
+                 check_crc=True, column_types=None, use_index=False, index_dir=None, time_span=None,
+                 processes=None):
         self.filename = filename
         self.english_units = english_units
+        self.message_types = message_types
+        self.message_fields = message_fields
+        self.known_fields_only = known_fields_only
+        self.projection_key = DefinitionMessage.projection_key(message_fields, known_fields_only)
+        self.lazy = lazy
+        self.check_crc = check_crc
+        self.column_types = column_types
+        self.time_span = time_span
 
         self.last_date = None
         self.last_day = None
 
-        self.matched_timestamp_16 = None
-
-        self.file = open(filename, 'rb')
-        try:
+        self._data_messages = {}
+        self._message_columns = []
+
+        # with an up to date index only the wanted records are read, so the file CRC can't be checked
+        self.file_index = None
+        self.indexed = False
+        if use_index:
+            self.file_index = FileIndex(filename, index_dir)
+            self.indexed = self.file_index.load()
+        # parallel decoding reads the file in the workers, it only applies to whole files parsed into messages
+        if processes and (streaming or data is not None or column_types is not None or use_index):
+            logger.warning("Parallel decoding only applies to whole files parsed into messages, parsing %s serially"
+                           % filename)
+            processes = None
+        if check_crc and not self.indexed:
+            crc = CRC()
+        else:
+            crc = None
+        if data is not None:
+            self.file = BufferReader(data, crc=crc)
+        elif read_mode == File.read_mode_mmap:
+            self.file = self.mmap_file(filename, crc)
+        elif read_mode == File.read_mode_buffer or buffer is not None:
+            self.file = self.read_file(filename, buffer, crc)
+        else:
+            self.file = StreamReader(open(filename, 'rb'), crc)
+        if processes:
+            self.parse_parallel(processes)
+        elif not streaming:
             self.parse()
-        except IndexError as error:
-            raise FitParseError(str(error) + " in " + filename)
+
+    def mmap_file(self, filename, crc=None):
+        with open(filename, 'rb') as file:
+            file_size = os.fstat(file.fileno()).st_size
+            if not file_size:
+                return BufferReader('', crc=crc)
+            file_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return BufferReader(file_map, file_size, file_map, crc)
+
+    def read_file(self, filename, buffer=None, crc=None):
+        # Read the whole file with one readinto, reusing the caller's buffer when it is passed in.
+        with open(filename, 'rb') as file:
+            file_size = os.fstat(file.fileno()).st_size
+            if buffer is None:
+                buffer = bytearray(file_size)
+            elif len(buffer) < file_size:
+                buffer.extend(bytearray(file_size - len(buffer)))
+            read_size = file.readinto(memoryview(buffer)[:file_size])
+        return BufferReader(buffer, read_size, crc=crc)
 
     def add_message_stats(self, message):
         timestamp = entry['timestamp']
@@ -52,82 +214,379 @@ class File():
         self.last_entry = entry
 
     def timestamp16_to_timestamp(self, timestamp_16):
-        if self.matched_timestamp_16:
-            if timestamp_16 >= self.matched_timestamp_16:
-                delta = timestamp_16 - self.matched_timestamp_16
-            else:
-                delta = (self.matched_timestamp_16 - 65535) + timestamp_16
-        else:
-            self.matched_timestamp_16 = timestamp_16
-            delta = 0
-        return self.last_message_timestamp + timedelta(0, delta)
-
-    def track_dates(self, timestamp):
+        # timestamp_16 is the low 16 bits of the time, so it is the last full timestamp moved on modulo 65536
+        if self.last_raw_timestamp is None:
+            return self.last_message_timestamp
+        return self.last_message_timestamp + ((timestamp_16 - self.last_raw_timestamp) & 0xffff)
+
+    def track_dates(self, timestamp, raw_timestamp, time_created=False):
+        # file_id's time_created is when the file was made, the first timestamp is the first message's own time
+        if self.first_message_timestamp is None and not time_created:
+            self.first_message_timestamp = timestamp
         self.last_message_timestamp = timestamp
-        self.matched_timestamp_16 = None
+        self.last_raw_timestamp = raw_timestamp
+
+    def compressed_timestamp(self, time_offset):
+        # the 5 bit offset from a compressed timestamp record header rolls over the last full timestamp
+        if self.last_raw_timestamp is None:
+            raise FitParseError("compressed timestamp before any full timestamp in " + self.filename)
+        delta = (time_offset - self.last_raw_timestamp) & 0x1f
+        self.track_dates(self.last_message_timestamp + delta, self.last_raw_timestamp + delta)
+        return self.last_message_timestamp
+
+    def message_timestamp(self, data_message):
+        time_created_timestamp = data_message['time_created']
+        if time_created_timestamp and not time_created_timestamp.invalid():
+            self.time_created_timestamp = time_created_timestamp['value']
+            self.track_dates(self.time_created_timestamp, time_created_timestamp['orig'], True)
+
+        message_timestamp = data_message['timestamp']
+        if message_timestamp and not message_timestamp.invalid():
+            message_timestamp_value = message_timestamp['value']
+            self.track_dates(message_timestamp_value, message_timestamp['orig'])
+        else:
+            message_timestamp_16 = data_message['timestamp_16']
+            if message_timestamp_16 and not message_timestamp_16.invalid():
+                message_timestamp_16_value = message_timestamp_16['value']
+                message_timestamp_value = self.timestamp16_to_timestamp(message_timestamp_16_value)
+                if self.first_message_timestamp is None:
+                    self.first_message_timestamp = message_timestamp_value
+            else:
+                message_timestamp_value = self.last_message_timestamp
+        return message_timestamp_value
 
     def parse(self):
-        self.file_header = FileHeader(self.file)
+        for (data_message_name, message_timestamp, data_message) in self.iter_messages():
+            try:
+                self._data_messages[data_message_name].append(data_message)
+            except:
+                self._data_messages[data_message_name] = [ data_message ]
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def read_header(self, check_size=True):
+        try:
+            self.file_header = FileHeader(self.file)
+        except IndexError as error:
+            raise FitParseError(str(error) + " in " + self.filename)
         if not self.file_header.check():
             logger.error("Bad header: " + str(self.file_header))
             return False
+        if self.check_crc and not self.file_header.check_crc():
+            raise FitParseError("Bad header CRC in " + self.filename)
 
         self.data_size = self.file_header.get_data_size()
+        file_size = self.file_header.get_header_size() + self.data_size
+        if self.check_crc:
+            file_size += 2
+        if check_size and file_size > self.file.size:
+            raise FitParseError("File truncated, %d of %d bytes in %s" % (self.file.size, file_size, self.filename))
 
         self._definition_messages = {}
-        self._data_messages = {}
-        data_consumed = 0
         self.record_count = 0
         self.first_message_timestamp = None
         self.last_message_timestamp = None
-
-        while self.data_size > data_consumed:
-            record_header = RecordHeader(self.file)
-            local_message_num = record_header.local_message()
-            data_consumed += record_header.file_size
-            self.record_count += 1
-
-            if record_header.definition_message():
-                definition_message = DefinitionMessage(record_header, self.file)
-                data_consumed += definition_message.file_size
-                self._definition_messages[local_message_num] = definition_message
-
-            elif record_header.data_message():
-                definition_message = self._definition_messages[local_message_num]
-                try:
-                    data_message = DataMessage(definition_message, self.file, self.english_units)
-                except:
-                    raise FitParseError("Failed to parse " + definition_message.name())
-
-                data_consumed += data_message.file_size
-
-                data_message_name = data_message.name()
-
-                time_created_timestamp = data_message['time_created']
-                if time_created_timestamp:
-                    self.time_created_timestamp = time_created_timestamp['value']
-                    self.track_dates(self.time_created_timestamp)
-
-                message_timestamp = data_message['timestamp']
-                if message_timestamp:
-                    message_timestamp_value = message_timestamp['value']
-                    self.track_dates(message_timestamp_value)
+        self.last_raw_timestamp = None
+        return True
+
+    def scan_records(self):
+        # First pass for parallel decoding: only record headers and definitions are read. Returns the offset of each
+        # data record, the offset of its definition, its definition, and its compressed timestamp offset.
+        records = []
+        if not self.read_header():
+            return records
+        header_size = self.file_header.get_header_size()
+        self.file.skip(header_size - self.file_header.file_size)
+        read_record_header = self.file.read_byte
+        record_header_table = RecordHeader.record_header_table
+        definition_messages = self._definition_messages
+        definition_offsets = {}
+        data_size = self.data_size
+        data_consumed = 0
+        try:
+            while data_size > data_consumed:
+                record_offset = header_size + data_consumed
+                (definition_message_header, local_message_num, time_offset) = record_header_table[read_record_header()]
+                data_consumed += 1
+                if definition_message_header:
+                    definition_message = DefinitionMessage.load(self.file, self.message_fields, self.known_fields_only,
+                                                                self.projection_key)
+                    data_consumed += definition_message.file_size
+                    definition_messages[local_message_num] = definition_message
+                    definition_offsets[local_message_num] = record_offset
+                else:
+                    definition_message = definition_messages[local_message_num]
+                    data_consumed += definition_message.data_size()
+                    self.file.skip(definition_message.data_size())
+                    records.append((record_offset, definition_offsets[local_message_num], definition_message,
+                                    time_offset))
+                self.record_count += 1
+        except IndexError as error:
+            raise FitParseError(str(error) + " in " + self.filename)
+        except Exception:
+            raise FitParseError("Failed to scan record %d in %s" % (self.record_count, self.filename))
+        if self.check_crc:
+            self.check_file_crc()
+        return records
+
+    def parse_parallel(self, processes):
+        # Unpack the data records in chunks across worker processes, then walk them in file order to fill in the
+        # timestamps, which depend on the records before them. Only unpacking is done in parallel, the fields are
+        # converted here, or when they are first accessed if the file is lazy.
+        try:
+            records = self.scan_records()
+        finally:
+            self.close()
+        decode = []
+        decoded_records = []
+        for (record_offset, definition_offset, definition_message, time_offset) in records:
+            wanted = self.message_types is None or definition_message.name() in self.message_types
+            decoded = wanted or (time_offset is None and definition_message.has_timestamps())
+            decoded_records.append((wanted, decoded))
+            if decoded:
+                decode.append((record_offset, definition_offset, not wanted))
+        chunk_count = processes * 4
+        chunk_size = max(1, (len(decode) + chunk_count - 1) / chunk_count)
+        chunks = [(self.filename, self.message_fields, self.known_fields_only, decode[index:index + chunk_size])
+                  for index in xrange(0, len(decode), chunk_size)]
+        pool = multiprocessing.Pool(processes)
+        try:
+            decoded_chunks = pool.map(decode_records, chunks)
+        except Exception as error:
+            raise FitParseError("Failed to decode records in %s: %s" % (self.filename, str(error)))
+        finally:
+            pool.close()
+            pool.join()
+
+        records_data = itertools.chain.from_iterable(decoded_chunks)
+        for ((record_offset, definition_offset, definition_message, time_offset), (wanted, decoded)) in \
+                itertools.izip(records, decoded_records):
+            if time_offset is not None:
+                message_timestamp = self.compressed_timestamp(time_offset)
+            if not decoded:
+                continue
+            data_message = DataMessage(definition_message, None, self.english_units, not wanted, self.lazy,
+                                       next(records_data))
+            if time_offset is None:
+                message_timestamp = self.message_timestamp(data_message)
+            if not wanted:
+                continue
+            if self.time_span is not None and not FileIndex.in_time_span(message_timestamp, self.time_span):
+                continue
+            data_message._timestamp = message_timestamp
+            try:
+                self._data_messages[data_message.name()].append(data_message)
+            except:
+                self._data_messages[data_message.name()] = [ data_message ]
+
+    def iter_messages(self, check_size=True):
+        # The decoded messages don't refer back to the file, so it is closed as soon as they have all been read, the
+        # reading fails, or the caller stops iterating.
+        try:
+            for message in self.iter_file_messages(check_size):
+                yield message
+        finally:
+            self.close()
+
+    def iter_file_messages(self, check_size):
+        if not self.read_header(check_size):
+            return
+        if self.indexed:
+            for message in self.iter_indexed_messages():
+                yield message
+            return
+        self.file.skip(self.file_header.get_header_size() - self.file_header.file_size)
+
+        debug = logger.isEnabledFor(logging.DEBUG)
+        read_record_header = self.file.read_byte
+        record_header_table = RecordHeader.record_header_table
+        definition_messages = self._definition_messages
+        wanted_messages = {}
+        message_columns = {}
+        file_index = self.file_index
+        if file_index is not None:
+            file_index.clear()
+        definition_offsets = {}
+        header_size = self.file_header.get_header_size()
+        data_size = self.data_size
+        data_consumed = 0
+        record_count = 0
+        try:
+            while data_size > data_consumed:
+                record_offset = header_size + data_consumed
+                record_header = read_record_header()
+                (definition_message_header, local_message_num, time_offset) = record_header_table[record_header]
+                data_consumed += 1
+                record_count += 1
+
+                if definition_message_header:
+                    definition_message = DefinitionMessage.load(self.file, self.message_fields, self.known_fields_only,
+                                                                self.projection_key)
+                    data_consumed += definition_message.file_size
+                    definition_messages[local_message_num] = definition_message
+                    definition_offsets[local_message_num] = record_offset
+                    wanted_messages[local_message_num] = (self.message_types is None or
+                                                          definition_message.name() in self.message_types)
+                    if self.column_types is not None and definition_message.name() in self.column_types:
+                        message_columns[local_message_num] = MessageColumns(definition_message)
+                        self._message_columns.append(message_columns[local_message_num])
+                    else:
+                        message_columns[local_message_num] = None
+                    data_message = None
                 else:
-                    message_timestamp_16 = data_message['timestamp_16']
-                    if message_timestamp_16:
-                        message_timestamp_16_value = message_timestamp_16['value']
-                        message_timestamp_value = self.timestamp16_to_timestamp(message_timestamp_16_value)
+                    definition_message = definition_messages[local_message_num]
+                    data_consumed += definition_message.data_size()
+                    if time_offset is not None:
+                        message_timestamp = self.compressed_timestamp(time_offset)
+                    if wanted_messages[local_message_num] and message_columns[local_message_num]:
+                        # columnar message type, keep the raw record and decode the whole column later
+                        data_message = None
+                        data = self.file.read(definition_message.data_size())
+                        raw_timestamp = None
+                        if time_offset is None:
+                            if definition_message.has_timestamp_16_only() and file_index is None:
+                                # rebuilt for the whole column from the last full timestamp and timestamp_16
+                                message_timestamp = self.last_message_timestamp
+                                raw_timestamp = self.last_raw_timestamp
+                            elif definition_message.has_timestamps():
+                                message_timestamp = self.message_timestamp(DataMessage(definition_message,
+                                                                                       BufferReader(data),
+                                                                                       self.english_units, True))
+                            else:
+                                message_timestamp = self.last_message_timestamp
+                        message_columns[local_message_num].append(record_count, data, message_timestamp,
+                                                                  raw_timestamp)
+                    elif wanted_messages[local_message_num]:
+                        data_message = DataMessage(definition_message, self.file, self.english_units, lazy=self.lazy)
+                        if time_offset is None:
+                            message_timestamp = self.message_timestamp(data_message)
+                        data_message._timestamp = message_timestamp
+                        if self.time_span is not None and not FileIndex.in_time_span(message_timestamp,
+                                                                                     self.time_span):
+                            data_message = None
                     else:
-                        message_timestamp_value = self.last_message_timestamp
-                data_message._timestamp = message_timestamp_value
-
-                try:
-                    self._data_messages[data_message_name].append(data_message)
-                except:
-                    self._data_messages[data_message_name] = [ data_message ]
+                        # unwanted message type, only decode what is needed to keep the timestamps in sync
+                        data_message = None
+                        if time_offset is None and definition_message.has_timestamps():
+                            message_timestamp = self.message_timestamp(DataMessage(definition_message, self.file,
+                                                                                   self.english_units, True))
+                        else:
+                            if time_offset is None:
+                                message_timestamp = self.last_message_timestamp
+                            self.file.skip(definition_message.data_size())
+                    if file_index is not None:
+                        file_index.add(record_offset, definition_offsets[local_message_num], definition_message.name(),
+                                       message_timestamp)
+
+                if debug:
+                    logger.debug("Record %d: consumed %d of %s %r" %
+                                    (record_count, data_consumed, data_size, self.english_units))
+
+                if data_message is not None:
+                    self.record_count = record_count
+                    yield (data_message.name(), data_message._timestamp, data_message)
+        except IndexError as error:
+            raise FitParseError(str(error) + " in " + self.filename)
+        except FitParseError:
+            raise
+        except Exception:
+            raise FitParseError("Failed to parse record %d in %s" % (record_count, self.filename))
+        self.record_count = record_count
+        if self.check_crc:
+            self.check_file_crc()
+        if file_index is not None:
+            file_index.time_created = getattr(self, 'time_created_timestamp', None)
+            file_index.last_timestamp = self.last_message_timestamp
+            file_index.save()
+
+    def iter_indexed_messages(self):
+        # Seek straight to the wanted records, loading the definition in effect for each one from its offset.
+        self.time_created_timestamp = self.file_index.time_created
+        self.last_message_timestamp = self.file_index.last_timestamp
+        self.record_count = len(self.file_index)
+        definition_offset = None
+        message_columns = {}
+        try:
+            for (record_index, record_offset, record_definition_offset, message_type, message_timestamp) in \
+                    self.file_index.records(self.message_types, self.time_span):
+                if record_definition_offset != definition_offset:
+                    self.file.seek(record_definition_offset + 1)
+                    definition_message = DefinitionMessage.load(self.file, self.message_fields,
+                                                                self.known_fields_only, self.projection_key)
+                    definition_offset = record_definition_offset
+                    columns = None
+                    if self.column_types is not None and message_type in self.column_types:
+                        columns = message_columns.get(definition_offset)
+                        if columns is None:
+                            columns = MessageColumns(definition_message)
+                            message_columns[definition_offset] = columns
+                            self._message_columns.append(columns)
+                self.file.seek(record_offset + 1)
+                if columns is not None:
+                    columns.append(record_index, self.file.read(definition_message.data_size()), message_timestamp)
+                    continue
+                data_message = DataMessage(definition_message, self.file, self.english_units, lazy=self.lazy)
+                data_message._timestamp = message_timestamp
+                yield (message_type, message_timestamp, data_message)
+        except IndexError as error:
+            raise FitParseError(str(error) + " in " + self.filename)
+        except FitParseError:
+            raise
+        except Exception:
+            raise FitParseError("Failed to parse indexed record at %d in %s" % (record_offset, self.filename))
+
+    def check_file_crc(self):
+        crc = self.file.crc_value()
+        (file_crc, ) = self.file.unpack('<H', 2)
+        if crc != file_crc:
+            raise FitParseError("Bad file CRC %04x, expected %04x in %s" % (crc, file_crc, self.filename))
+
+    def columns(self, message_name):
+        message_columns = [columns for columns in self._message_columns
+                           if columns.name() == message_name and columns.record_indexes]
+        if message_columns:
+            columns = MessageColumns.merge(message_columns, self.english_units)
+            if self.time_span is not None:
+                columns = MessageColumns.select_time_span(columns, self.time_span)
+            return columns
+        return None
 
-            logger.debug("Record %d: consumed %d of %s %r" %
-                            (self.record_count, data_consumed, self.data_size, self.english_units))
+    def sensor_data(self, message_name):
+        # message_name has to be decoded as columns, and three_d_sensor_calibration as messages to calibrate it
+        columns = self.columns(message_name)
+        if columns is None:
+            return None
+        return SensorData(message_name, columns, self['three_d_sensor_calibration']).samples()
+
+    def heart_rate_series(self):
+        # hr messages have to be decoded as columns
+        message_columns = [columns for columns in self._message_columns
+                           if columns.name() == 'hr' and columns.record_indexes]
+        if not message_columns:
+            return None
+        return HeartRateData(message_columns).series()
+
+    def hrv_data(self):
+        # hrv messages have to be decoded as columns
+        message_columns = [columns for columns in self._message_columns
+                           if columns.name() == 'hrv' and columns.record_indexes]
+        if not message_columns:
+            return None
+        return HrvData.from_columns(message_columns)
+
+    def track(self):
+        # record messages have to be decoded as columns, laps and sessions are read from their messages
+        columns = self.columns('record')
+        if columns is None:
+            return None
+        return Track(columns, self['lap'], self['session'])
 
     def type(self):
         return self['file_id'][0]['type'].value()
@@ -4,9 +4,10 @@
 # copyright Tom Goetz
 #
 
-import logging, collections
+import logging, collections, struct
 
 from Data import Data
+from CRC import CRC
 
 class FileHeader(Data):
 
@@ -49,6 +50,15 @@ class FileHeader(Data):
                 (self['protocol_version'] == FileHeader.protocol_version) and
                 (self['data_type'] == FileHeader.file_data_type))
 
+    def check_crc(self):
+        # headers without a CRC, or with it left as 0, can't be checked
+        if not self.decode_optional() or not self['crc']:
+            return True
+        crc = CRC()
+        crc.update(struct.pack('<BBHI4B', self['header_size'], self['protocol_version'], self['profile_version'],
+                               self['data_size'], *self['data_type']))
+        return (crc.value() == self['crc'])
+
     def __str__(self):
         return ("%s: header size %d prot ver %x prof ver %d" %
                 (self.__class__.__name__, self['header_size'], self['protocol_version'], self['profile_version']))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+#
+# copyright Tom Goetz
+#
+
+import os, json, logging
+
+from Field import TimestampField
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class FileIndex():
+    # Record offsets, the offset of the definition in effect for each record, message types, and timestamps for a
+    # FIT file, saved as JSON next to the file or in an index directory. The index is only used while the file's
+    # size and mtime match the ones it was built from. Timestamps are saved as FIT time, without the local UTC offset
+    # that parsing shifts them by, since the offset can change between building and using the index.
+    index_version = 2
+    index_extension = '.idx'
+
+    def __init__(self, filename, index_dir=None):
+        self.filename = filename
+        if index_dir:
+            self.index_filename = os.path.join(index_dir, os.path.basename(filename) + FileIndex.index_extension)
+        else:
+            self.index_filename = filename + FileIndex.index_extension
+        file_stat = os.stat(filename)
+        self.file_size = file_stat.st_size
+        self.file_mtime = file_stat.st_mtime
+        self.clear()
+
+    def clear(self):
+        self.message_types = []
+        self._message_type_indexes = {}
+        self.offsets = []
+        self.definition_offsets = []
+        self.types = []
+        self.timestamps = []
+        self.time_created = None
+        self.last_timestamp = None
+
+    def add(self, offset, definition_offset, message_type, timestamp):
+        try:
+            type_index = self._message_type_indexes[message_type]
+        except KeyError:
+            type_index = len(self.message_types)
+            self.message_types.append(message_type)
+            self._message_type_indexes[message_type] = type_index
+        self.offsets.append(offset)
+        self.definition_offsets.append(definition_offset)
+        self.types.append(type_index)
+        self.timestamps.append(timestamp)
+
+    def load(self):
+        try:
+            with open(self.index_filename, 'r') as index_file:
+                index = json.load(index_file)
+        except (IOError, ValueError):
+            return False
+        if (index.get('version') != FileIndex.index_version or index.get('size') != self.file_size or
+                index.get('mtime') != self.file_mtime):
+            logger.info("Index %s is out of date" % self.index_filename)
+            return False
+        self.message_types = [str(message_type) for message_type in index['message_types']]
+        self._message_type_indexes = dict((message_type, type_index)
+                                          for type_index, message_type in enumerate(self.message_types))
+        self.offsets = index['offsets']
+        self.definition_offsets = index['definition_offsets']
+        self.types = index['types']
+        utc_offset = FileIndex.utc_offset()
+        self.timestamps = [FileIndex.shift_timestamp(timestamp, utc_offset) for timestamp in index['timestamps']]
+        self.time_created = FileIndex.shift_timestamp(index['time_created'], utc_offset)
+        self.last_timestamp = FileIndex.shift_timestamp(index['last_timestamp'], utc_offset)
+        return True
+
+    def save(self):
+        utc_offset = -FileIndex.utc_offset()
+        index = {
+            'version' : FileIndex.index_version, 'size' : self.file_size, 'mtime' : self.file_mtime,
+            'message_types' : self.message_types, 'offsets' : self.offsets,
+            'definition_offsets' : self.definition_offsets, 'types' : self.types,
+            'timestamps' : [FileIndex.shift_timestamp(timestamp, utc_offset) for timestamp in self.timestamps],
+            'time_created' : FileIndex.shift_timestamp(self.time_created, utc_offset),
+            'last_timestamp' : FileIndex.shift_timestamp(self.last_timestamp, utc_offset)
+        }
+        # write a temporary file and rename it so a reader never sees a partial index
+        temp_filename = self.index_filename + '.tmp'
+        try:
+            with open(temp_filename, 'w') as index_file:
+                json.dump(index, index_file, separators=(',', ':'))
+            os.rename(temp_filename, self.index_filename)
+        except (IOError, OSError) as error:
+            logger.error("Failed to write index %s: %s" % (self.index_filename, str(error)))
+
+    def records(self, message_types=None, time_span=None):
+        # yields (record_index, offset, definition_offset, message_type, timestamp) for the matching records
+        if message_types is not None:
+            wanted_types = set(self._message_type_indexes[message_type] for message_type in message_types
+                               if message_type in self._message_type_indexes)
+        for record_index, type_index in enumerate(self.types):
+            if message_types is not None and type_index not in wanted_types:
+                continue
+            timestamp = self.timestamps[record_index]
+            if time_span is not None and not FileIndex.in_time_span(timestamp, time_span):
+                continue
+            yield (record_index, self.offsets[record_index], self.definition_offsets[record_index],
+                   self.message_types[type_index], timestamp)
+
+    @staticmethod
+    def utc_offset():
+        # the shift TimestampField applies to FIT timestamps
+        return TimestampField.utc_offset() - 1
+
+    @staticmethod
+    def shift_timestamp(timestamp, utc_offset):
+        if timestamp is None:
+            return None
+        return timestamp + utc_offset
+
+    @staticmethod
+    def in_time_span(timestamp, time_span):
+        # time spans are (start, end) with the end excluded, either end may be None
+        (start, end) = time_span
+        if timestamp is None:
+            return False
+        return (start is None or timestamp >= start) and (end is None or timestamp < end)
+
+    def __len__(self):
+        return len(self.offsets)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+#
+# copyright Tom Goetz
+#
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from Field import EventTimestamp12Field
+
+
+class HeartRateData():
+    # Rebuilds a continuous heart rate series from hr messages decoded as columns. Most hr messages only carry the
+    # low 12 bits of each event's timestamp, in 1/1024 s, which are added up modulo 4096 from the last full
+    # event_timestamp. Message timestamps anchor the event timestamps to the file's time.
+    event_timestamp_rollover = 0x1000
+    invalid_heart_rate = 0xff
+    invalid_event_timestamp = 0xffffffff
+
+    def __init__(self, message_columns):
+        if numpy is None:
+            raise ImportError("numpy is required for heart rate data")
+        self.message_columns = message_columns
+
+    def events(self, columns):
+        # the events in one definition's records, using the raw records so every packed byte is kept
+        records = columns.records()
+        record_count = len(records)
+        fields = dict((field.name, (field_number, count))
+                      for (field_number, field, invalid, offset, type, count) in columns.column_layout)
+        if 'filtered_bpm' not in fields:
+            return None
+        heart_rates = records['field_%d' % fields['filtered_bpm'][0]].reshape(record_count, -1)
+        values = numpy.zeros(heart_rates.shape, numpy.int64)
+        full = numpy.zeros(heart_rates.shape, bool)
+        has_timestamp = numpy.zeros(heart_rates.shape, bool)
+        if 'event_timestamp_12' in fields:
+            packed = records['field_%d' % fields['event_timestamp_12'][0]].reshape(record_count, -1)
+            event_timestamps = EventTimestamp12Field.unpack(packed)[:, :heart_rates.shape[1]]
+            width = event_timestamps.shape[1]
+            values[:, :width] = event_timestamps
+            has_timestamp[:, :width] = True
+        if 'event_timestamp' in fields:
+            event_timestamps = records['field_%d' % fields['event_timestamp'][0]].reshape(record_count, -1)
+            event_timestamps = event_timestamps[:, :heart_rates.shape[1]]
+            width = event_timestamps.shape[1]
+            present = (event_timestamps != HeartRateData.invalid_event_timestamp)
+            values[:, :width] = numpy.where(present, event_timestamps, values[:, :width])
+            full[:, :width] = present
+            has_timestamp[:, :width] |= present
+        # Events with an invalid heart rate still move the event timestamp on and are only dropped at the end, unused
+        # slots at the end of a record have all bits set in both fields.
+        unused = (heart_rates == HeartRateData.invalid_heart_rate) & ~full & \
+                 (values == HeartRateData.event_timestamp_rollover - 1)
+        valid = has_timestamp & ~unused
+        record_indexes = numpy.frombuffer(columns.record_indexes, 'L')
+        timestamps = numpy.frombuffer(columns.timestamps, 'l')
+        sample_rows = numpy.repeat(numpy.arange(record_count), heart_rates.shape[1])[valid.ravel()]
+        # records with a full event_timestamp anchor their first full event to the record's timestamp
+        anchor_rows = numpy.flatnonzero(full.any(1))
+        anchor_events = values[anchor_rows, full[anchor_rows].argmax(1)]
+        return (record_indexes[sample_rows], values[valid], full[valid], heart_rates[valid],
+                record_indexes[anchor_rows], timestamps[anchor_rows], anchor_events)
+
+    def series(self):
+        events = [self.events(columns) for columns in self.message_columns]
+        events = [event for event in events if event is not None]
+        if not events:
+            return None
+        (sample_records, values, full, heart_rates, anchor_records, anchor_timestamps, anchor_events) = \
+            [numpy.concatenate(part) for part in zip(*events)]
+        order = numpy.argsort(sample_records, kind='mergesort')
+        (sample_records, values, full, heart_rates) = (sample_records[order], values[order], full[order],
+                                                       heart_rates[order])
+        anchor_order = numpy.argsort(anchor_records, kind='mergesort')
+        (anchor_records, anchor_timestamps, anchor_events) = (anchor_records[anchor_order],
+                                                              anchor_timestamps[anchor_order],
+                                                              anchor_events[anchor_order])
+        # events before the first full event_timestamp can't be placed
+        full_indexes = numpy.flatnonzero(full)
+        if not len(full_indexes):
+            return None
+        start = full_indexes[0]
+        (sample_records, values, full, heart_rates) = (sample_records[start:], values[start:], full[start:],
+                                                       heart_rates[start:])
+        # wrap-aware deltas of the low 12 bits, restarted at every full event_timestamp
+        low_values = numpy.where(full, values % HeartRateData.event_timestamp_rollover, values)
+        deltas = numpy.zeros(len(values), numpy.int64)
+        deltas[1:] = (low_values[1:] - low_values[:-1]) % HeartRateData.event_timestamp_rollover
+        deltas[full] = 0
+        offsets = numpy.cumsum(deltas)
+        segment_indexes = numpy.cumsum(full) - 1
+        event_timestamps = values[full][segment_indexes] + offsets - offsets[full][segment_indexes]
+        anchor_indexes = numpy.searchsorted(anchor_records, sample_records, 'right') - 1
+        timestamps = (anchor_timestamps[anchor_indexes] +
+                      (event_timestamps - anchor_events[anchor_indexes]) / 1024.0)
+        valid = (heart_rates != HeartRateData.invalid_heart_rate)
+        return { 'timestamp' : timestamps[valid], 'heart_rate' : heart_rates[valid] }
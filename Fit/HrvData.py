@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+#
+# copyright Tom Goetz
+#
+
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class HrvData():
+    # The beat to beat intervals from hrv messages in milliseconds, kept in one array('H') per file rather than as an
+    # object per beat, with sliding window RMSSD and SDNN computed from running sums in a single pass.
+    invalid_interval = 0xffff
+
+    def __init__(self, intervals=None):
+        if numpy is None:
+            raise ImportError("numpy is required for hrv data")
+        self.intervals = array.array('H')
+        if intervals is not None:
+            self.append(intervals)
+
+    def append(self, intervals):
+        # intervals is an array of intervals in ms, invalid ones are dropped
+        intervals = numpy.asarray(intervals)
+        intervals = intervals[intervals != HrvData.invalid_interval]
+        self.intervals.fromstring(intervals.astype(numpy.uint16).tostring())
+
+    @staticmethod
+    def from_columns(message_columns):
+        # the raw interval arrays from hrv messages decoded as columns, put back in file order
+        record_indexes = []
+        intervals = []
+        for columns in message_columns:
+            fields = dict((field.name, field_number)
+                          for (field_number, field, invalid, offset, type, count) in columns.column_layout)
+            if 'time' not in fields:
+                continue
+            records = columns.records()
+            time = records['field_%d' % fields['time']].reshape(len(records), -1)
+            record_indexes.append(numpy.repeat(numpy.frombuffer(columns.record_indexes, 'L'), time.shape[1]))
+            intervals.append(time.ravel())
+        hrv_data = HrvData()
+        if intervals:
+            order = numpy.argsort(numpy.concatenate(record_indexes), kind='mergesort')
+            hrv_data.append(numpy.concatenate(intervals)[order])
+        return hrv_data
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def metrics(self, window=300):
+        # For each beat, RMSSD and SDNN in ms over the beats in the preceding window seconds, with the time of the
+        # beat in seconds from the first one. Windows are summed from cumulative sums rather than recomputed.
+        intervals = numpy.frombuffer(self.intervals, numpy.uint16).astype(numpy.int64)
+        beat_count = len(intervals)
+        times = numpy.cumsum(intervals)
+        beats = numpy.arange(beat_count)
+        window_starts = numpy.searchsorted(times, times - window * 1000, 'right')
+        counts = beats - window_starts + 1
+        interval_sums = numpy.concatenate(([0], numpy.cumsum(intervals)))
+        square_sums = numpy.concatenate(([0], numpy.cumsum(intervals * intervals)))
+        totals = interval_sums[beats + 1] - interval_sums[window_starts]
+        squares = square_sums[beats + 1] - square_sums[window_starts]
+        differences = numpy.zeros(beat_count, numpy.int64)
+        differences[1:] = numpy.diff(intervals)
+        difference_sums = numpy.concatenate(([0], numpy.cumsum(differences * differences)))
+        # the successive differences in a window start with the one ending at its second beat
+        difference_counts = counts - 1
+        difference_totals = difference_sums[beats + 1] - difference_sums[numpy.minimum(window_starts + 1, beats + 1)]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            variances = numpy.maximum(squares - totals * totals / counts.astype(numpy.float64), 0) / difference_counts
+            sdnn = numpy.sqrt(variances)
+            rmssd = numpy.sqrt(difference_totals / difference_counts.astype(numpy.float64))
+        sdnn[difference_counts == 0] = numpy.nan
+        rmssd[difference_counts == 0] = numpy.nan
+        return { 'time' : times / 1000.0, 'rmssd' : rmssd, 'sdnn' : sdnn }
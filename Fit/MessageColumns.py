@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+#
+# copyright Tom Goetz
+#
+
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class MessageColumns():
+    numpy_types = { 'CHAR' : 'S', 'INT8' : 'i1', 'UINT8' : 'u1', 'INT16' : 'i2', 'UINT16' : 'u2', 'INT32' : 'i4',
+                    'UINT32' : 'u4', 'INT64' : 'i8', 'UINT64' : 'u8', 'FLOAT32' : 'f4', 'FLOAT64' : 'f8' }
+
+    def __init__(self, definition_message):
+        if numpy is None:
+            raise ImportError("numpy is required for columnar decoding")
+        self.definition_message = definition_message
+        self.column_layout = definition_message.column_layout()
+        self._data = bytearray()
+        self.record_indexes = array.array('L')
+        self.timestamps = array.array('l')
+        self.raw_timestamps = array.array('l')
+
+    def name(self):
+        return self.definition_message.name()
+
+    def append(self, record_index, data, timestamp, raw_timestamp=None):
+        # Records timestamped by timestamp_16 pass the last full timestamp and its raw FIT value, their timestamps
+        # are filled in for the whole column by timestamp16_to_timestamps().
+        self._data += data
+        self.record_indexes.append(record_index)
+        if timestamp is None:
+            self.timestamps.append(-1)
+        else:
+            self.timestamps.append(timestamp)
+        if raw_timestamp is None:
+            self.raw_timestamps.append(-1)
+        else:
+            self.raw_timestamps.append(raw_timestamp)
+
+    def dtype(self):
+        if self.definition_message.architecture():
+            byte_order = '>'
+        else:
+            byte_order = '<'
+        names = []
+        formats = []
+        offsets = []
+        for (field_number, field, invalid, offset, type, count) in self.column_layout:
+            names.append('field_%d' % field_number)
+            offsets.append(offset)
+            if type == 'CHAR':
+                formats.append('S%d' % count)
+            elif count > 1:
+                formats.append((byte_order + MessageColumns.numpy_types[type], (count, )))
+            else:
+                formats.append(byte_order + MessageColumns.numpy_types[type])
+        return numpy.dtype({'names' : names, 'formats' : formats, 'offsets' : offsets,
+                            'itemsize' : self.definition_message.data_size()})
+
+    def records(self):
+        return numpy.frombuffer(self._data, self.dtype())
+
+    def add_columns(self, columns, converted_columns, mask=None):
+        for column_name, (values, invalid) in converted_columns.iteritems():
+            if mask is not None:
+                invalid = invalid | mask
+            if column_name in columns:
+                # values for the same name are summed, as when data messages merge subfields
+                column = columns[column_name]
+                values = numpy.where(invalid, 0, values) + column.filled(0)
+                invalid = invalid & numpy.ma.getmaskarray(column)
+            columns[column_name] = numpy.ma.array(values, mask=invalid)
+
+    def columns(self, english_units=False):
+        records = self.records()
+        columns = {}
+        dependant_fields = []
+        for (field_number, field, invalid, offset, type, count) in self.column_layout:
+            column = records['field_%d' % field_number]
+            if type == 'CHAR':
+                columns[field.name] = numpy.ma.array(column)
+            elif field.is_dependant_field:
+                dependant_fields.append((field, invalid, column))
+            else:
+                self.add_columns(columns, field.convert_column(column, invalid, english_units))
+        for (field, invalid, column) in dependant_fields:
+            control_column = columns[field.dependant_field_control_field]
+            control_mask = numpy.ma.getmaskarray(control_column)
+            for control_value in numpy.unique(control_column.compressed()):
+                try:
+                    dependant_field = field.dependant_field(int(control_value))
+                except KeyError:
+                    continue
+                self.add_columns(columns, dependant_field.convert_column(column, invalid, english_units),
+                                 control_mask | (control_column.data != control_value))
+        timestamps = numpy.frombuffer(self.timestamps, 'l')
+        columns['timestamp'] = numpy.ma.array(timestamps, mask=(timestamps == -1))
+        return columns
+
+    @staticmethod
+    def timestamp16_to_timestamps(timestamps, raw_timestamps, timestamp_16s):
+        # vectorized File.timestamp16_to_timestamp(): each last full timestamp moved on by its timestamp_16 modulo 65536
+        return timestamps + ((timestamp_16s.astype(numpy.int64) - raw_timestamps) & 0xffff)
+
+    @staticmethod
+    def resolve_timestamps(columns, raw_timestamps):
+        if 'timestamp_16' not in columns:
+            return
+        timestamp_16s = columns['timestamp_16']
+        selected = (raw_timestamps != -1) & ~numpy.ma.getmaskarray(timestamp_16s)
+        if selected.any():
+            timestamps = columns['timestamp']
+            timestamps[selected] = MessageColumns.timestamp16_to_timestamps(timestamps.data[selected],
+                                                                            raw_timestamps[selected],
+                                                                            timestamp_16s.data[selected])
+
+    @staticmethod
+    def select_time_span(columns, time_span):
+        (start, end) = time_span
+        timestamps = columns['timestamp']
+        selected = ~numpy.ma.getmaskarray(timestamps)
+        if start is not None:
+            selected &= (timestamps.data >= start)
+        if end is not None:
+            selected &= (timestamps.data < end)
+        return dict((column_name, column[selected]) for column_name, column in columns.iteritems())
+
+    @staticmethod
+    def merge(message_columns, english_units=False):
+        # Combine the columns from all of the definitions used for a message type back into file order. Columns
+        # missing from some definitions are masked for those records.
+        if len(message_columns) == 1:
+            columns = message_columns[0].columns(english_units)
+            MessageColumns.resolve_timestamps(columns, numpy.frombuffer(message_columns[0].raw_timestamps, 'l'))
+            return columns
+        all_columns = [columns.columns(english_units) for columns in message_columns]
+        record_count = [len(columns.record_indexes) for columns in message_columns]
+        record_indexes = [numpy.frombuffer(columns.record_indexes, 'L') for columns in message_columns]
+        order = numpy.argsort(numpy.concatenate(record_indexes), kind='mergesort')
+        column_names = set()
+        for columns in all_columns:
+            column_names.update(columns.keys())
+        merged_columns = {}
+        for column_name in column_names:
+            parts = [columns.get(column_name) for columns in all_columns]
+            template = next(part for part in parts if part is not None)
+            # array fields can have a different count in each definition, or be a single value in some, the
+            # narrower ones are padded with masked values
+            shape = template.shape[1:]
+            if any(part is not None and part.shape[1:] != shape for part in parts):
+                shape = (max(part.shape[1] if part.ndim > 1 else 1 for part in parts if part is not None), )
+            for index, part in enumerate(parts):
+                if part is None:
+                    parts[index] = numpy.ma.masked_all((record_count[index], ) + shape, template.dtype)
+                elif part.shape[1:] != shape:
+                    part = part.reshape(len(part), -1)
+                    padded = numpy.ma.masked_all((record_count[index], ) + shape, part.dtype)
+                    padded[:, :part.shape[1]] = part
+                    parts[index] = padded
+            merged_columns[column_name] = numpy.ma.concatenate(parts)[order]
+        raw_timestamps = numpy.concatenate([numpy.frombuffer(columns.raw_timestamps, 'l')
+                                            for columns in message_columns])[order]
+        MessageColumns.resolve_timestamps(merged_columns, raw_timestamps)
+        return merged_columns
@@ -5,7 +5,6 @@
 #
 
 import logging
-from datetime import tzinfo, timedelta, datetime
 
 from OutputData import OutputData
 from FieldStats import *
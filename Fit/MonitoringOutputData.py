@@ -5,7 +5,6 @@
 #
 
 import logging
-from datetime import tzinfo, timedelta, datetime
 
 from OutputData import OutputData
 from FieldStats import *
@@ -17,6 +16,9 @@ logger.setLevel(logging.INFO)
 
 class MonitoringOutputData(OutputData):
     _sleep_period_padding = 1
+    # timestamps are integer seconds, days and hours are bucketed with integer math
+    _secs_per_hour = 60 * 60
+    _secs_per_day = 24 * _secs_per_hour
 
     def __init__(self, files, sleep_period):
         self.sleep_period = sleep_period
@@ -38,6 +40,7 @@ class MonitoringOutputData(OutputData):
         self.matched_timestamp_16 = 0
 
         self._last_intensity = 0
+        self.headings_without_units = set()
 
         OutputData.__init__(self, files)
         self.summarize_stats()
@@ -53,6 +56,13 @@ class MonitoringOutputData(OutputData):
             else:
                 heading = field_name
             self.heading_names_list.append(heading)
+            if units is None:
+                self.headings_without_units.add(field_name)
+        elif units is not None and field_name in self.headings_without_units:
+            # invalid values have no units, take them from the field's first valid value instead
+            self.headings_without_units.discard(field_name)
+            if units:
+                self.heading_names_list[self.field_names_list.index(field_name)] = field_name + " (" + units + ")"
 
     def parse_message(self, message, hourly_stats, daily_stats):
         entry = {}
@@ -63,7 +73,9 @@ class MonitoringOutputData(OutputData):
                 self.last_timestamp = message.timestamp()
                 self.add_entry_field(entry, 'timestamp', self.last_timestamp)
             else:
-                if field_name == 'intensity':
+                if field.invalid():
+                    pass
+                elif field_name == 'intensity':
                     self.last_intensity = field.value()
                 elif field_name == 'heart_rate':
                     stat_name = "intensity_" + str(self.last_intensity) + "_hr"
@@ -83,7 +95,7 @@ class MonitoringOutputData(OutputData):
 
         self.last_timestamp = file.time_created()
 
-        day = self.last_timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+        day = self.last_timestamp - (self.last_timestamp % self._secs_per_day)
         if not self.first_day:
             self.first_day = day
         self.last_day = day
@@ -96,7 +108,7 @@ class MonitoringOutputData(OutputData):
         monitoring_messages = file['monitoring']
         if monitoring_messages:
             for message in monitoring_messages:
-                hour = self.last_timestamp.replace(minute=0, second=0, microsecond=0)
+                hour = self.last_timestamp - (self.last_timestamp % self._secs_per_hour)
                 if not hour in self._device_hourly_stats.keys():
                     self._device_hourly_stats[hour] = {}
                 if not device in self._device_hourly_stats[hour].keys():
@@ -215,14 +227,14 @@ class MonitoringOutputData(OutputData):
 
     def add_derived_hourly_stats(self):
         for hour in self._hourly_stats.keys():
-            hour_integer = hour.hour
+            hour_integer = (hour % self._secs_per_day) / self._secs_per_hour
             if (hour_integer >= (self.sleep_period['end'] - self._sleep_period_padding) and
                 hour_integer <= (self.sleep_period['end'] + self._sleep_period_padding)):
                 stats_hour = self._hourly_stats[hour]
                 if 'intensity_0_hr' in stats_hour.keys():
                     rhr_stat = stats_hour['intensity_0_hr']
                     self._hourly_stats[hour]['resting_heart_rate'] = rhr_stat.copy()
-                    day = hour.replace(hour=0)
+                    day = hour - (hour % self._secs_per_day)
                     if day in self._daily_stats:
                         daily_stats = self._daily_stats[day]
                         if 'resting_heart_rate' in daily_stats.keys():
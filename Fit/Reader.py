@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+#
+# copyright Tom Goetz
+#
+
+import os, struct
+
+
+byte_struct = struct.Struct('B')
+
+
+class StreamReader():
+
+    def __init__(self, file, crc=None):
+        self.file = file
+        self.crc = crc
+        self.size = os.fstat(file.fileno()).st_size
+
+    def read(self, size):
+        data = self.file.read(size)
+        if len(data) < size:
+            raise IndexError("Read of %d bytes past end of file" % size)
+        if self.crc:
+            self.crc.update(data)
+        return data
+
+    def read_byte(self):
+        return ord(self.read(1))
+
+    def unpack(self, unpack_format, size):
+        return struct.unpack(unpack_format, self.read(size))
+
+    def unpack_struct(self, decoder):
+        return decoder.unpack(self.read(decoder.size))
+
+    def skip(self, size):
+        if self.crc:
+            # skipped bytes still have to go through the CRC
+            self.read(size)
+        else:
+            self.file.seek(size, 1)
+
+    def seek(self, offset):
+        self.file.seek(offset)
+
+    def crc_value(self):
+        return self.crc.value()
+
+    def close(self):
+        self.file.close()
+
+
+class BufferReader():
+
+    def __init__(self, buffer, size=None, source=None, crc=None):
+        self.buffer = buffer
+        if size is None:
+            self.size = len(buffer)
+        else:
+            self.size = size
+        self.source = source
+        self.crc = crc
+        self.offset = 0
+
+    def _advance(self, size):
+        offset = self.offset
+        self.offset += size
+        if self.offset > self.size:
+            raise IndexError("Read of %d bytes at offset %d past end of %d byte buffer" % (size, offset, self.size))
+        if self.crc:
+            self.crc.update(self.buffer[offset:self.offset])
+        return offset
+
+    def read(self, size):
+        offset = self._advance(size)
+        return self.buffer[offset:self.offset]
+
+    def read_byte(self):
+        return byte_struct.unpack_from(self.buffer, self._advance(1))[0]
+
+    def unpack(self, unpack_format, size):
+        return struct.unpack_from(unpack_format, self.buffer, self._advance(size))
+
+    def unpack_struct(self, decoder):
+        return decoder.unpack_from(self.buffer, self._advance(decoder.size))
+
+    def skip(self, size):
+        self._advance(size)
+
+    def seek(self, offset):
+        self.offset = offset
+
+    def crc_value(self):
+        return self.crc.value()
+
+    def close(self):
+        if self.source:
+            self.source.close()
+            self.source = None
+        self.buffer = None
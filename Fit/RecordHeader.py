@@ -24,6 +24,8 @@ class RecordHeader(Data):
         return (self.record_header() & 0x80) >> 7
 
     def message_type(self):
+        if self.compressed_timestamp():
+            return 0
         return (self.record_header() & 0x40) >> 6
 
     def message_type_str(self):
@@ -36,8 +38,25 @@ class RecordHeader(Data):
         return not self.message_type()
 
     def local_message(self):
+        if self.compressed_timestamp():
+            return (self.record_header() & 0x60) >> 5
         return (self.record_header() & 0x0f)
 
+    def time_offset(self):
+        if self.compressed_timestamp():
+            return (self.record_header() & 0x1f)
+        return None
+
+    @staticmethod
+    def decode(record_header):
+        if record_header & 0x80:
+            return (False, (record_header & 0x60) >> 5, record_header & 0x1f)
+        return (bool(record_header & 0x40), record_header & 0x0f, None)
+
     def __str__(self):
         return ("%s: Local %s message %d (Compressed %d)" %
                 (self.__class__.__name__, self.message_type_str(), self.local_message(), self.compressed_timestamp()))
+
+
+# (definition message, local message number, compressed timestamp offset) for every possible record header byte
+RecordHeader.record_header_table = map(RecordHeader.decode, xrange(256))
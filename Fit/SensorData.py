@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+#
+# copyright Tom Goetz
+#
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class SensorData():
+    # Flattens the per message sample arrays of accelerometer, gyroscope, and magnetometer messages, decoded as
+    # columns, into one array per axis with a millisecond timestamp for every sample. Raw counts are calibrated with
+    # the latest three_d_sensor_calibration message for the sensor.
+    sensor_messages = {
+        'accelerometer_data' : ('accelerometer', ['accel_x', 'accel_y', 'accel_z'],
+                                ['calibrated_accel_x', 'calibrated_accel_y', 'calibrated_accel_z',
+                                 'compressed_calibrated_accel_x', 'compressed_calibrated_accel_y',
+                                 'compressed_calibrated_accel_z']),
+        'gyroscope_data'     : ('gyroscope', ['gyro_x', 'gyro_y', 'gyro_z'],
+                                ['calibrated_gyro_x', 'calibrated_gyro_y', 'calibrated_gyro_z']),
+        'magnetometer_data'  : ('compass', ['mag_x', 'mag_y', 'mag_z'],
+                                ['calibrated_mag_x', 'calibrated_mag_y', 'calibrated_mag_z'])
+    }
+
+    def __init__(self, message_name, columns, calibration_messages=None):
+        if numpy is None:
+            raise ImportError("numpy is required for sensor data")
+        (self.sensor_type, self.axis_names, self.calibrated_names) = SensorData.sensor_messages[message_name]
+        self.columns = columns
+        self.calibrations = []
+        if calibration_messages:
+            for message in calibration_messages:
+                if message['sensor_type'].value() == self.sensor_type:
+                    self.calibrations.append(message)
+            self.calibrations.sort(key=lambda message: message.timestamp())
+
+    def samples_mask(self):
+        # samples past the end of a message's sample count have invalid offsets or counts
+        if 'sample_time_offset' in self.columns:
+            return ~numpy.ma.getmaskarray(self.columns['sample_time_offset'])
+        return ~numpy.ma.getmaskarray(self.columns[self.axis_names[0]])
+
+    def sample_timestamps(self, samples_mask):
+        # milliseconds since the FIT epoch: the message timestamp and timestamp_ms plus each sample's offset
+        timestamps = self.columns['timestamp'].filled(0).astype(numpy.int64) * 1000
+        if 'timestamp_ms' in self.columns:
+            timestamps += self.columns['timestamp_ms'].filled(0).astype(numpy.int64)
+        if 'sample_time_offset' in self.columns:
+            sample_timestamps = timestamps[:, None] + self.columns['sample_time_offset'].filled(0)
+        else:
+            sample_timestamps = numpy.repeat(timestamps[:, None], samples_mask.shape[1], 1)
+        return sample_timestamps[samples_mask]
+
+    def calibrate(self, counts, samples_mask):
+        # (counts - level shift - offset) rotated by the orientation matrix and scaled by factor / divisor
+        message_timestamps = self.columns['timestamp'].filled(0)
+        calibration_timestamps = [message.timestamp() for message in self.calibrations]
+        calibration_indexes = numpy.searchsorted(calibration_timestamps, message_timestamps, 'right') - 1
+        calibration_indexes = numpy.repeat(calibration_indexes.clip(0), samples_mask.shape[1])[samples_mask.ravel()]
+        calibrated = numpy.empty(counts.shape)
+        for calibration_index in numpy.unique(calibration_indexes):
+            calibration = self.calibrations[calibration_index]
+            selected = (calibration_indexes == calibration_index)
+            offset = numpy.array(calibration['offset_cal'].value(), dtype=numpy.float64)
+            orientation = numpy.array(calibration['orientation_matrix'].value(), dtype=numpy.float64).reshape(3, 3)
+            scale = calibration['calibration_factor'].value() / float(calibration['calibration_divisor'].value())
+            shifted = counts[selected] - calibration['level_shift'].value() - offset
+            calibrated[selected] = shifted.dot(orientation.T) * scale
+        return calibrated
+
+    def samples(self):
+        samples_mask = self.samples_mask()
+        samples = { 'timestamp' : self.sample_timestamps(samples_mask) }
+        for name in self.axis_names + self.calibrated_names:
+            if name in self.columns:
+                samples[name] = self.columns[name][samples_mask]
+        if self.calibrations and all(name in self.columns for name in self.axis_names):
+            counts = numpy.column_stack([self.columns[name].filled(0)[samples_mask] for name in self.axis_names])
+            samples['calibrated'] = self.calibrate(counts.astype(numpy.float64), samples_mask)
+        return samples
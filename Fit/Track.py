@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+#
+# copyright Tom Goetz
+#
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Track():
+    # The points of an activity from record messages decoded as columns, with positions in degrees, the great
+    # circle distance and climb to each point, and lap and session summaries computed from the arrays.
+    semicircles_to_degrees = 180.0 / 2 ** 31
+    earth_radius = 6371008.8
+    column_names = [ 'timestamp', 'altitude', 'heart_rate', 'cadence', 'distance', 'speed' ]
+
+    def __init__(self, columns, lap_messages=None, session_messages=None):
+        if numpy is None:
+            raise ImportError("numpy is required for tracks")
+        self.points = {}
+        for column_name in Track.column_names:
+            if column_name in columns:
+                self.points[column_name] = columns[column_name]
+        self.points['latitude'] = self.degrees(columns.get('position_lat'))
+        self.points['longitude'] = self.degrees(columns.get('position_long'))
+        self.points['segment_distance'] = self.segment_distances()
+        self.points['track_distance'] = numpy.cumsum(self.points['segment_distance'])
+        (self.points['ascent'], self.points['descent']) = self.climb()
+        self.laps = self.summaries(lap_messages)
+        self.sessions = self.summaries(session_messages)
+
+    def degrees(self, semicircles):
+        if semicircles is None:
+            return numpy.ma.masked_all(len(self.points['timestamp']))
+        return semicircles * Track.semicircles_to_degrees
+
+    def segment_distances(self):
+        # haversine distance in meters from the previous point with a position to each point with one
+        latitude = self.points['latitude']
+        longitude = self.points['longitude']
+        distances = numpy.zeros(len(latitude))
+        positions = numpy.flatnonzero(~(numpy.ma.getmaskarray(latitude) | numpy.ma.getmaskarray(longitude)))
+        if len(positions) > 1:
+            latitude = numpy.radians(latitude.data[positions])
+            longitude = numpy.radians(longitude.data[positions])
+            haversine = (numpy.sin(numpy.diff(latitude) / 2) ** 2 +
+                         numpy.cos(latitude[:-1]) * numpy.cos(latitude[1:]) * numpy.sin(numpy.diff(longitude) / 2) ** 2)
+            distances[positions[1:]] = 2 * Track.earth_radius * numpy.arcsin(numpy.sqrt(numpy.minimum(haversine, 1)))
+        return distances
+
+    def climb(self):
+        # altitude gained and lost since the previous point with an altitude
+        ascent = numpy.zeros(len(self.points['timestamp']))
+        descent = numpy.zeros(len(self.points['timestamp']))
+        altitude = self.points.get('altitude')
+        if altitude is not None:
+            altitudes = numpy.flatnonzero(~numpy.ma.getmaskarray(altitude))
+            changes = numpy.diff(altitude.data[altitudes])
+            ascent[altitudes[1:]] = numpy.maximum(changes, 0)
+            descent[altitudes[1:]] = numpy.maximum(-changes, 0)
+        return (ascent, descent)
+
+    @staticmethod
+    def statistic(values, function):
+        if values is None or not values.count():
+            return None
+        return function(values).item()
+
+    def summary(self, start_time, end_time):
+        # Points from start_time to end_time. Distance and climb are to the points after the first, the segment to
+        # the first point belongs to the one before it.
+        timestamps = self.points['timestamp'].data
+        points = (timestamps >= start_time) & (timestamps <= end_time)
+        segments = points & (timestamps > start_time)
+        summary = {
+            'start_time' : start_time, 'end_time' : end_time, 'elapsed_time' : end_time - start_time,
+            'records' : int(points.sum()),
+            'distance' : self.points['segment_distance'][segments].sum(),
+            'ascent' : self.points['ascent'][segments].sum(), 'descent' : self.points['descent'][segments].sum()
+        }
+        for column_name in [ 'heart_rate', 'speed', 'cadence' ]:
+            values = self.points.get(column_name)
+            if values is not None:
+                values = values[points]
+            summary['avg_' + column_name] = Track.statistic(values, numpy.ma.mean)
+            summary['max_' + column_name] = Track.statistic(values, numpy.ma.max)
+        return summary
+
+    def summaries(self, messages):
+        # one summary per lap or session message, or one for the whole track when there are none
+        timestamps = self.points['timestamp']
+        if not len(timestamps):
+            return []
+        if not messages:
+            return [self.summary(timestamps.min(), timestamps.max())]
+        summaries = []
+        start_time = timestamps.min()
+        for message in messages:
+            end_time = message.timestamp()
+            message_start_time = message['start_time']
+            if message_start_time is not None and not message_start_time.invalid():
+                start_time = message_start_time.value()
+            summaries.append(self.summary(start_time, end_time))
+            start_time = end_time
+        return summaries
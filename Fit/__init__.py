@@ -1,4 +1,4 @@
-from File import File
+from File import File, FitParseError, check_file, scan_metadata
 from MonitoringInfoOutputData import MonitoringInfoOutputData
 from MonitoringOutputData import MonitoringOutputData
 from DeviceOutputData import DeviceOutputData
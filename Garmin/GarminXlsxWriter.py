@@ -21,6 +21,8 @@ class GarminXlsxWriter(object):
     highlight_pattern       = 9
     highlight_light_blue    = 10
 
+    fit_epoch = datetime.datetime(1989, 12, 31, 0, 0, 0)
+
     def __init__(self, filename):
         logger.info("Creating '%s'..." % filename)
         self.autofit_col_padding = 0
@@ -52,9 +54,15 @@ class GarminXlsxWriter(object):
         self.col_widths = []
         self.col_count = 0
 
+    def timestamp_to_datetime(self, timestamp):
+        # FIT data is passed in as integer seconds since the FIT epoch and only becomes a datetime when written
+        if isinstance(timestamp, datetime.datetime):
+            return timestamp
+        return self.fit_epoch + datetime.timedelta(0, timestamp)
+
     def record_data_period(self, start_date, end_date):
-        self.workbook.set_custom_property('Data Start Date',  start_date)
-        self.workbook.set_custom_property('Data End Date',  end_date)
+        self.workbook.set_custom_property('Data Start Date',  self.timestamp_to_datetime(start_date))
+        self.workbook.set_custom_property('Data End Date',  self.timestamp_to_datetime(end_date))
 
     def next_row(self):
         self.row += 1
@@ -245,7 +253,7 @@ class GarminXlsxWriter(object):
         self.col = 0
         if row_highlight:
             self.set_highlight_row(row_highlight)
-        self.write_cell_date_and_time(values[0])
+        self.write_cell_date_and_time(self.timestamp_to_datetime(values[0]))
         for index in range(1, len(values)):
             if index in cell_highlights.keys():
                 cell_highlight = cell_highlights[index]
@@ -258,7 +266,7 @@ class GarminXlsxWriter(object):
         logger.debug("Summary %s : %s" % (str(date), str(summary_dict)))
         field_names = summary_dict.keys()
         self.col = 0
-        self.write_cell_datetime(date)
+        self.write_cell_datetime(self.timestamp_to_datetime(date))
         self.set_highlight_row(self.highlight_gray)
         for field_name in field_names:
             self.col = 1
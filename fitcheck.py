@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+#
+# copyright Tom Goetz
+#
+
+import os, sys, getopt, re, logging
+
+import Fit
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+def dir_to_fit_files(input_dir):
+    file_names = []
+
+    for file in os.listdir(input_dir):
+        match = re.search('.*\.fit', file)
+        if match:
+            file_names.append(input_dir + "/" + file)
+
+    return sorted(file_names)
+
+def check_files(file_names, verbose):
+    failed = 0
+    for file_name in file_names:
+        try:
+            Fit.check_file(file_name)
+            if verbose:
+                print "%s: OK" % file_name
+        except Fit.FitParseError as error:
+            print "%s: FAILED %s" % (file_name, error.message)
+            failed += 1
+    print "Checked %d files, %d failed" % (len(file_names), failed)
+    return failed
+
+
+def usage(program):
+    print '%s [-v] -i <inputfile> | -d <inputdir> ...' % program
+    sys.exit()
+
+def main(argv):
+    verbose = False
+    file_names = []
+
+    try:
+        opts, args = getopt.getopt(argv,"d:hi:v", ["input_dir=", "inputfile=", "verbose"])
+    except getopt.GetoptError:
+        usage(sys.argv[0])
+
+    for opt, arg in opts:
+        if opt == '-h':
+            usage(sys.argv[0])
+        elif opt in ("-v", "--verbose"):
+            verbose = True
+        elif opt in ("-d", "--input_dir"):
+            file_names.extend(dir_to_fit_files(arg))
+        elif opt in ("-i", "--inputfile"):
+            file_names.append(arg)
+
+    if not file_names:
+        print "Missing arguments:"
+        usage(sys.argv[0])
+
+    if check_files(file_names, verbose):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
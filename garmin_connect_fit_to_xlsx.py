@@ -15,18 +15,22 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 class GarminFitData():
+    message_types = set([ 'file_id', 'device_info', 'monitoring_info', 'monitoring' ])
 
     def __init__(self, input_file, input_dir, english_units):
         self.fitfiles = []
 
+        # each file is read whole into the same buffer and closed before the next one is opened
+        buffer = bytearray()
         if input_file:
             logger.info("Reading file: " + input_file)
-            self.fitfiles.append(Fit.File(input_file, english_units))
+            self.fitfiles.append(Fit.File(input_file, english_units, buffer=buffer, message_types=self.message_types))
         if input_dir:
             logger.info("Reading directory: " + input_dir)
             file_names = self.dir_to_fit_files(input_dir)
             for file_name in file_names:
-                self.fitfiles.append(Fit.File(file_name, english_units))
+                self.fitfiles.append(Fit.File(file_name, english_units, buffer=buffer,
+                                              message_types=self.message_types))
 
     def dir_to_fit_files(self, input_dir):
         file_names = []
@@ -140,8 +144,8 @@ class GarminFitData():
                 gd_xlsx.set_highlight_col(index, GarminXlsxWriter.highlight_light_gray)
 
     def write_activity_row(self, gd_xlsx, field_names, entry, hourly_highlight=False):
-        day = entry['timestamp'].day
-        hour = entry['timestamp'].hour
+        day = entry['timestamp'] / (24 * 60 * 60)
+        hour = entry['timestamp'] / (60 * 60)
         if day != self.last_day:
             row_highlight = GarminXlsxWriter.highlight_dark_gray
             self.last_day = day
@@ -1,3 +1,4 @@
 #!/bin/bash
 
 sudo pip install XlsxWriter
+sudo pip install numpy